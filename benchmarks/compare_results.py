@@ -0,0 +1,98 @@
+"""
+Compare two benchmark result files written by run_benchmarks.
+
+Cases are matched by benchmark name and sweep parameters.  Each phase
+time and the peak memory of the new results is shown as a ratio of the
+old one, and ratios above the threshold are flagged as regressions, in
+which case the exit status is 1.
+
+Usage, from the top of the repository:
+
+    python -m benchmarks.compare_results OLD.json NEW.json [--threshold 1.2]
+"""
+
+import argparse
+import json
+import sys
+
+MEASURES = ('build', 'draw', 'total', 'peak_memory')
+
+
+def load_results(path):
+    """Results of a file keyed by (name, sorted params)."""
+    with open(path) as f:
+        data = json.load(f)
+    return data['environment'], {
+        (r['name'], tuple(sorted(r['params'].items()))): r
+        for r in data['results']}
+
+
+def compare(old, new, threshold=1.2, min_seconds=0.005):
+    """
+    Ratios of new to old for every case in both result sets
+    Input:
+        old, new -- results keyed as returned by load_results
+        threshold -- ratio above which a measure counts as a regression
+        min_seconds -- times where both runs are shorter than this are
+                       too noisy to flag
+    Output:
+        list of (key, {measure: ratio or None}, list of regressed measures)
+    """
+    rows = []
+    for key in old:
+        if key not in new:
+            continue
+        ratios, regressed = {}, []
+        for measure in MEASURES:
+            before, after = old[key][measure], new[key][measure]
+            if before is None or after is None or before == 0:
+                ratios[measure] = None
+                continue
+            ratios[measure] = after / before
+            noisy = (measure != 'peak_memory'
+                     and max(before, after) < min_seconds)
+            if ratios[measure] > threshold and not noisy:
+                regressed.append(measure)
+        rows.append((key, ratios, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='new/old ratio flagged as a regression')
+    args = parser.parse_args(argv)
+
+    old_env, old = load_results(args.old)
+    new_env, new = load_results(args.new)
+    print('old: {revision} ({date})  new: {revision_new} ({date_new})'.format(
+        revision_new=new_env['revision'], date_new=new_env['date'],
+        **old_env))
+
+    rows = compare(old, new, args.threshold)
+    print('{:<14} {:<58}'.format('benchmark', 'params')
+          + ''.join('{:>13}'.format(m) for m in MEASURES))
+    for (name, params), ratios, regressed in rows:
+        cells = ''.join(
+            '{:>13}'.format('-' if ratios[m] is None else
+                            '{:.2f}x{}'.format(ratios[m],
+                                               '!' if m in regressed else ''))
+            for m in MEASURES)
+        print('{:<14} {:<58}'.format(
+            name, ', '.join('{}={}'.format(k, v) for k, v in params)) + cells)
+
+    missing = set(old) ^ set(new)
+    if missing:
+        print('{} cases are only in one of the files'.format(len(missing)))
+    regressions = sum(bool(r) for _, _, r in rows)
+    if regressions:
+        print('{} cases regressed by more than {:.0%}'.format(
+            regressions, args.threshold - 1))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Import time budget for the extension collection.
+
+Loading the collection through pandex imports every module of every
+extension directory.  The heavy dependencies (numpy, pandas and
+matplotlib) are only imported when an extension is first called, so this
+should take tens of milliseconds.  The check imports every module in a
+fresh interpreter several times, compares the median time with the
+budget, and also fails if any heavy dependency was imported.
+
+Usage, from the top of the repository:
+
+    python -m benchmarks.import_budget [--budget-ms 60] [--runs 5]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXTENSIONS = ('demo', 'matplotblog', 'wedge_plot', 'year_heatmap')
+HEAVY = ('numpy', 'pandas', 'matplotlib', 'pyarrow')
+
+# Median milliseconds to import every extension module.  Measured at about
+# 30 ms, a third of it the calendar module, against about 1 s when numpy,
+# pandas and matplotlib were imported eagerly
+BUDGET_MS = 60
+
+_CHILD = """
+import importlib, json, sys, time
+modules = {modules!r}
+start = time.perf_counter()
+for name in modules:
+    importlib.import_module(name)
+seconds = time.perf_counter() - start
+heavy = sorted(m for m in {heavy!r} if m in sys.modules)
+print(json.dumps({{'seconds': seconds, 'heavy': heavy}}))
+"""
+
+
+def extension_modules():
+    """Dotted names of every module in the extension directories."""
+    modules = []
+    for directory in EXTENSIONS:
+        for filename in sorted(os.listdir(os.path.join(ROOT, directory))):
+            if filename.endswith('.py'):
+                modules.append('{}.{}'.format(directory, filename[:-3]))
+    return modules
+
+
+def measure_imports(runs=5):
+    """
+    Import every extension module in `runs` fresh interpreters
+    Output:
+        (list of seconds per run, sorted heavy modules that were imported)
+    """
+    import json
+    code = _CHILD.format(modules=extension_modules(), heavy=HEAVY)
+    times, heavy = [], set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        times.append(result['seconds'])
+        heavy.update(result['heavy'])
+    return times, sorted(heavy)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS,
+                        help='most milliseconds the imports may take')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='fresh interpreters to time, the median is used')
+    args = parser.parse_args(argv)
+
+    times, heavy = measure_imports(args.runs)
+    median_ms = statistics.median(times) * 1000
+    print('Imported {} modules in {:.1f} ms (median of {}, budget {:.0f} ms)'
+          .format(len(extension_modules()), median_ms, args.runs,
+                  args.budget_ms))
+    failed = False
+    if median_ms > args.budget_ms:
+        print('FAIL: import time is over budget')
+        failed = True
+    if heavy:
+        print('FAIL: heavy dependencies imported at load time: '
+              + ', '.join(heavy))
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""
+Benchmark suite for the extensions in this collection.
+
+Each extension is run over a sweep of synthetic data sizes and timed in
+two phases: 'build', the extension call that makes the figure (or adds
+the columns for the demo extensions), and 'draw', rendering the figure
+to PNG in memory.  Times are the best of several runs.  One more run is
+made under tracemalloc to record the peak memory allocated through
+Python and numpy, which leaves out memory held inside the Agg renderer.
+
+Results are written to a JSON file named after the git revision, so that
+two revisions can be compared with compare_results.
+
+Usage, from the top of the repository:
+
+    python -m benchmarks.run_benchmarks [--quick] [--only NAME ...]
+    python -m benchmarks.compare_results results/OLD.json results/NEW.json
+"""
+
+import argparse
+from collections import namedtuple
+import datetime
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+from demo.circle_calcs import circle_calculations
+from demo.geometry_calcs import geometry_calculations
+from demo.sphere_calcs import sphere_calculations
+from matplotblog.stripe_matrix import stripe_matrix
+from matplotblog.warm_stripes import heat_stripes
+from wedge_plot.wedge_plot import wedge_plot
+from year_heatmap.year_heatmap import year_heatmap
+
+from .synthetic_data import (calendar_frame, radius_frame, stripes_frame,
+                             stripes_matrix_frame, wedge_frame)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'results')
+
+# A benchmark makes its data from the sweep parameters with `setup`, and
+# `build` runs the extension on that data and returns the figure to draw,
+# or None if there is nothing to draw
+Benchmark = namedtuple('Benchmark', ['name', 'sweep', 'quick', 'setup',
+                                     'build'])
+
+
+def _calendar_setup(rows, years, cols, layout):
+    return calendar_frame(rows, years, cols)
+
+
+def _calendar_build(df, rows, years, cols, layout):
+    fig, _ = year_heatmap(df, layout=layout)
+    return fig
+
+
+def _wedge_setup(slices, rings):
+    return wedge_frame(slices, rings)
+
+
+def _wedge_build(data, slices, rings):
+    df, kwargs = data
+    return wedge_plot(df, **kwargs)
+
+
+def _wedge_labels_setup(slices, rings, labels):
+    return wedge_frame(slices, rings)
+
+
+def _wedge_labels_build(data, slices, rings, labels):
+    df, kwargs = data
+    return wedge_plot(df, label_detail=labels, **kwargs)
+
+
+def _stripes_setup(length, mode):
+    return stripes_frame(length)
+
+
+def _stripes_build(df, length, mode):
+    return heat_stripes(df, 'anomaly', mode=mode)
+
+
+def _matrix_setup(length, series, sort):
+    return stripes_matrix_frame(length, series)
+
+
+def _matrix_build(df, length, series, sort):
+    fig, _ = stripe_matrix(df, sort=sort)
+    return fig
+
+
+def _radius_setup(rows, extension):
+    return radius_frame(rows)
+
+
+def _radius_build(df, rows, extension):
+    extensions = {
+        'circle_calculations': circle_calculations,
+        'sphere_calculations': sphere_calculations,
+        'geometry_calculations': geometry_calculations,
+    }
+    # Work on a copy so each run starts without the added columns
+    extensions[extension](df.copy(deep=False))
+    return None
+
+
+BENCHMARKS = [
+    Benchmark('year_heatmap',
+              {'rows': [10_000, 100_000, 1_000_000], 'years': [1, 3],
+               'cols': [1, 3], 'layout': ['subplots', 'single']},
+              {'rows': [10_000], 'years': [1, 2], 'cols': [1, 2],
+               'layout': ['subplots', 'single']},
+              _calendar_setup, _calendar_build),
+    Benchmark('wedge_plot',
+              {'slices': [5, 20, 80], 'rings': [1, 3, 6]},
+              {'slices': [5, 20], 'rings': [1, 3]},
+              _wedge_setup, _wedge_build),
+    # Time saved by only drawing the labels that fit
+    Benchmark('wedge_plot',
+              {'slices': [80, 200, 500], 'rings': [3, 6],
+               'labels': ['all', 'auto']},
+              {'slices': [200], 'rings': [3], 'labels': ['all', 'auto']},
+              _wedge_labels_setup, _wedge_labels_build),
+    Benchmark('heat_stripes',
+              {'length': [100, 1_000, 10_000], 'mode': ['patches', 'raster']},
+              {'length': [100, 1_000], 'mode': ['patches', 'raster']},
+              _stripes_setup, _stripes_build),
+    Benchmark('heat_stripes',
+              {'length': [100_000, 1_000_000], 'mode': ['raster']},
+              {'length': [100_000], 'mode': ['raster']},
+              _stripes_setup, _stripes_build),
+    Benchmark('stripe_matrix',
+              {'length': [150, 10_000], 'series': [100, 1_000, 10_000],
+               'sort': [None, 'trend']},
+              {'length': [150], 'series': [100, 1_000], 'sort': [None]},
+              _matrix_setup, _matrix_build),
+    Benchmark('demo',
+              {'rows': [10_000, 1_000_000, 10_000_000],
+               'extension': ['circle_calculations', 'sphere_calculations',
+                             'geometry_calculations']},
+              {'rows': [10_000, 1_000_000],
+               'extension': ['circle_calculations', 'sphere_calculations',
+                             'geometry_calculations']},
+              _radius_setup, _radius_build),
+]
+
+
+def run_case(benchmark, params, repeats=3):
+    """
+    Time one set of sweep parameters of a benchmark
+    Output:
+        dict of the benchmark 'name' and 'params', the best 'build',
+        'draw' and 'total' times in seconds ('draw' is None when there
+        is no figure) and the 'peak_memory' in bytes
+    """
+    data = benchmark.setup(**params)
+
+    def once():
+        start = time.perf_counter()
+        fig = benchmark.build(data, **params)
+        built = time.perf_counter()
+        if fig is not None:
+            fig.savefig(io.BytesIO(), format='png')
+        drawn = time.perf_counter()
+        return built - start, (drawn - built) if fig is not None else None
+
+    times = [once() for _ in range(repeats)]
+    build = min(t[0] for t in times)
+    draw = None if times[0][1] is None else min(t[1] for t in times)
+
+    tracemalloc.start()
+    try:
+        once()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'name': benchmark.name,
+        'params': params,
+        'build': build,
+        'draw': draw,
+        'total': build + (draw or 0),
+        'peak_memory': peak_memory,
+    }
+
+
+def run_benchmarks(quick=False, only=None, repeats=3, progress=None):
+    """
+    Run every benchmark case
+    Input:
+        quick -- use the small sweeps, for a fast check
+        only -- list of benchmark names to run.  Default is all
+        repeats -- timed runs of each case, the best is kept
+        progress -- optional function called with each result
+    Output:
+        list of result dicts, as returned by run_case
+    """
+    results = []
+    for benchmark in BENCHMARKS:
+        if only and benchmark.name not in only:
+            continue
+        sweep = benchmark.quick if quick else benchmark.sweep
+        for values in itertools.product(*sweep.values()):
+            result = run_case(benchmark, dict(zip(sweep, values)), repeats)
+            results.append(result)
+            if progress is not None:
+                progress(result)
+    return results
+
+
+def environment():
+    """The revision and software the results were measured with."""
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True,
+            cwd=os.path.dirname(RESULTS_DIR)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = 'unknown'
+    return {
+        'revision': revision,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'matplotlib': matplotlib.__version__,
+    }
+
+
+def _print_result(result):
+    params = ', '.join('{}={}'.format(k, v)
+                       for k, v in result['params'].items())
+    draw = '-' if result['draw'] is None else '{:.4f}s'.format(result['draw'])
+    print('{:<14} {:<58} build {:.4f}s  draw {:>8}  peak {:.1f} MB'.format(
+        result['name'], params, result['build'], draw,
+        result['peak_memory'] / 1e6))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--quick', action='store_true',
+                        help='run the small sweeps only')
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        choices=sorted({b.name for b in BENCHMARKS}),
+                        help='benchmarks to run')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='timed runs per case, the best is kept')
+    parser.add_argument('--out', help='results file.  Default is '
+                        'benchmarks/results/<revision>.json')
+    args = parser.parse_args(argv)
+
+    env = environment()
+    results = run_benchmarks(args.quick, args.only, args.repeats,
+                             progress=_print_result)
+    out = args.out or os.path.join(RESULTS_DIR,
+                                   '{}.json'.format(env['revision']))
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump({'environment': env, 'quick': args.quick,
+                   'results': results}, f, indent=1)
+    print('Results written to', out)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Synthetic data for the benchmark suite.
+
+Every generator takes a seed so that runs on different revisions plot
+exactly the same data.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def calendar_frame(rows, years=1, cols=1, seed=0):
+    """
+    Time series for year_heatmap: `rows` timestamps spread evenly over
+    `years` calendar years from 2000, with `cols` random value columns
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2000-01-01')
+    span = pd.Timestamp('{}-01-01'.format(2000 + years)) - start
+    index = start + (np.arange(rows) * (span / rows))
+    return pd.DataFrame(rng.gamma(2.0, 10.0, size=(rows, cols)),
+                        index=pd.DatetimeIndex(index, name='time'),
+                        columns=['value{}'.format(i) for i in range(cols)])
+
+
+def wedge_frame(slices, rings, seed=0):
+    """
+    Data for wedge_plot, one row per slice and one column per ring, with
+    the colours, radius and wedge_width arguments needed for any number
+    of rings
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.integers(0, 100, size=(slices, rings)),
+                      index=['slice {}'.format(i) for i in range(slices)],
+                      columns=['ring {}'.format(i) for i in range(rings)])
+    palettes = ['Purples', 'Greens', 'OrRd', 'Blues', 'RdPu']
+    width = 0.8 / rings
+    kwargs = {
+        'colours': [palettes[i % len(palettes)] for i in range(rings)],
+        'radius': [0.3 + width * (i + 1) for i in range(rings)],
+        'wedge_width': [width] * rings,
+    }
+    return df, kwargs
+
+
+def stripes_frame(length, seed=0):
+    """
+    Random walk for heat_stripes over a contiguous integer index, like
+    the yearly temperature anomalies it was written for
+    """
+    rng = np.random.default_rng(seed)
+    values = np.cumsum(rng.normal(0, 0.1, length))
+    return pd.DataFrame({'anomaly': values},
+                        index=pd.RangeIndex(1000, 1000 + length, name='year'))
+
+
+def stripes_matrix_frame(length, series, seed=0):
+    """
+    Random walks for stripe_matrix, one column per series, each with its
+    own offset and a tenth of the series missing their first tenth of rows
+    """
+    rng = np.random.default_rng(seed)
+    values = (np.cumsum(rng.normal(0, 0.1, (length, series)), axis=0)
+              + rng.normal(0, 5, series))
+    values[:length // 10, ::10] = np.nan
+    return pd.DataFrame(values,
+                        index=pd.RangeIndex(1000, 1000 + length, name='year'),
+                        columns=['series {}'.format(i) for i in range(series)])
+
+
+def radius_frame(rows, seed=0):
+    """Radius column for the demo geometry extensions."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'radius': rng.random(rows) * 10})
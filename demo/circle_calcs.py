@@ -3,9 +3,11 @@ An example pandas dataframe extension that can be added
 and shared easily using the pandex framework
 """
 
-from math import pi
+from .geometry_kernels import add_columns, geometry_kernel
+from .parallel_kernels import parallel_geometry_kernel
 
-def circle_calculations(df, radius='radius'):
+def circle_calculations(df, radius='radius', dtype='float64',
+                        executor=None, workers=None):
     """
     Calculates the circumference and area of a circle 
     given a column of radius and adds the result to the
@@ -13,9 +15,21 @@ def circle_calculations(df, radius='radius'):
     Input:
         df -- dataframe
         radius -- column name containing the radius values
+        dtype -- float dtype of the new columns, 'float32' halves
+                 the memory used
+        executor -- None to run on one core, or 'thread', 'process'
+                    or a running executor to split the radius into
+                    chunks computed in parallel, see parallel_kernels.
+                    Frames shorter than PARALLEL_MIN_ROWS run serially
+        workers -- number of chunks to split the radius into
     """
     if radius not in df.columns:
-        raise IndexError('Radius column {} not in dataframe')
+        raise IndexError('Radius column {} not in dataframe'.format(radius))
 
-    df['circumference'] = 2 * pi * df[radius]
-    df['area'] = pi * df[radius] ** 2
+    outputs = ('circumference', 'area')
+    if executor is None:
+        results = geometry_kernel(df[radius], outputs, dtype)
+    else:
+        results = parallel_geometry_kernel(df[radius], outputs, dtype,
+                                           executor, workers)
+    add_columns(df, results)
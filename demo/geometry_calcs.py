@@ -0,0 +1,37 @@
+"""
+An example pandas dataframe extension that can be added
+and shared easily using the pandex framework
+"""
+
+from .geometry_kernels import OUTPUTS, add_columns, geometry_kernel
+from .parallel_kernels import parallel_geometry_kernel
+
+def geometry_calculations(df, radius='radius', outputs=OUTPUTS, dtype='float64',
+                          executor=None, workers=None):
+    """
+    Calculates any of the circumference and area of a circle and
+    the surface area and volume of a sphere given a column of
+    radius, reading the radius once, and adds the results to the
+    dataframe
+    Input:
+        df -- dataframe
+        radius -- column name containing the radius values
+        outputs -- names of the columns to add, any of
+                   'circumference', 'area', 'surface_area', 'volume'
+        dtype -- float dtype of the new columns, 'float32' halves
+                 the memory used
+        executor -- None to run on one core, or 'thread', 'process'
+                    or a running executor to split the radius into
+                    chunks computed in parallel, see parallel_kernels.
+                    Frames shorter than PARALLEL_MIN_ROWS run serially
+        workers -- number of chunks to split the radius into
+    """
+    if radius not in df.columns:
+        raise IndexError('Radius column {} not in dataframe'.format(radius))
+
+    if executor is None:
+        results = geometry_kernel(df[radius], outputs, dtype)
+    else:
+        results = parallel_geometry_kernel(df[radius], outputs, dtype,
+                                           executor, workers)
+    add_columns(df, results)
@@ -0,0 +1,74 @@
+"""
+Fused kernel for the circle and sphere geometry extensions.
+
+The radius column is read once and every requested output is written
+into a preallocated array with numpy's out= arguments, sharing the
+powers of the radius between formulas so that no full length
+temporaries are made beyond the outputs themselves.
+"""
+
+from math import pi
+
+from render_tools.lazy_import import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+OUTPUTS = ('circumference', 'area', 'surface_area', 'volume')
+
+
+def geometry_kernel(radius, outputs=OUTPUTS, dtype='float64', out=None):
+    """
+    Calculates circle and sphere measurements from an array of radius
+    values in a single pass
+    Input:
+        radius -- array like of radius values
+        outputs -- names of the measurements to calculate, any of
+                   'circumference', 'area', 'surface_area', 'volume'
+        dtype -- numpy float dtype of the results, float32 halves the
+                 memory used
+        out -- optional dict of output name to array to write the
+               results into, such as slices of larger shared arrays
+    Output:
+        dict of output name to array
+    """
+    unknown = set(outputs) - set(OUTPUTS)
+    if unknown:
+        raise ValueError('Unknown outputs {}, choose from {}'
+                         .format(sorted(unknown), ', '.join(OUTPUTS)))
+
+    r = np.asarray(radius, dtype=dtype)
+    if out is None:
+        results = {name: np.empty(r.shape, dtype=dtype) for name in outputs}
+    else:
+        results = {name: out[name] for name in outputs}
+
+    if 'circumference' in results:
+        np.multiply(r, 2 * pi, out=results['circumference'])
+
+    # area = pi r^2, surface area = 4 area, volume = surface area * r / 3
+    if not {'area', 'surface_area', 'volume'} & set(results):
+        return results
+    area = results.get('area')
+    if area is None:
+        area = results.get('surface_area', results.get('volume'))
+    np.multiply(r, r, out=area)
+    area *= pi
+
+    if 'surface_area' in results or 'volume' in results:
+        surface = results.get('surface_area', results.get('volume'))
+        np.multiply(area, 4, out=surface)
+        if 'volume' in results:
+            volume = results['volume']
+            np.multiply(surface, r, out=volume)
+            volume /= 3
+    return results
+
+
+def add_columns(df, results):
+    """
+    Adds each result array to the dataframe as a column without
+    copying it
+    """
+    for name, values in results.items():
+        df[name] = pd.Series(values, index=df.index, copy=False)
@@ -0,0 +1,178 @@
+"""
+Chunked multi-core execution of the fused geometry kernel.
+
+The radius column is split into contiguous chunks and each chunk is
+computed by geometry_kernel straight into its slice of the output
+arrays.  With threads the outputs are ordinary arrays, since numpy
+releases the GIL inside the ufuncs.  With processes the radius and the
+outputs are placed in shared memory and the workers are only sent the
+block names and the chunk bounds, so no data is pickled either way.
+
+Below PARALLEL_MIN_ROWS rows the cost of handing out the chunks is more
+than the time saved, and the kernel runs serially.  The value was
+measured with measure_crossover, which can be rerun to calibrate it for
+another machine.
+"""
+
+import os
+import time
+
+from render_tools.lazy_import import lazy_import
+
+from .geometry_kernels import OUTPUTS, geometry_kernel
+
+futures = lazy_import('concurrent.futures')
+np = lazy_import('numpy')
+shared_memory = lazy_import('multiprocessing.shared_memory')
+
+# Rows below which the serial kernel is faster than the thread pool,
+# measured with measure_crossover().  The process pool also copies the
+# radius in and the results out of shared memory and needs larger frames
+# still, or a reused pool on a machine with spare memory bandwidth
+PARALLEL_MIN_ROWS = 1_000_000
+
+
+def parallel_geometry_kernel(radius, outputs=OUTPUTS, dtype='float64',
+                             executor='thread', workers=None,
+                             min_rows=PARALLEL_MIN_ROWS):
+    """
+    Calculates circle and sphere measurements like geometry_kernel,
+    with contiguous chunks of the radius computed in parallel
+    Input:
+        radius -- array like of radius values
+        outputs -- names of the measurements to calculate, as for
+                   geometry_kernel
+        dtype -- numpy float dtype of the results
+        executor -- 'thread' or 'process' to start a pool for this call,
+                    or a running ThreadPoolExecutor or ProcessPoolExecutor
+                    to reuse, which avoids the pool start up cost
+        workers -- number of chunks and, for a new pool, of workers.
+                   Default is the number of CPUs
+        min_rows -- below this many rows the kernel runs serially
+    Output:
+        dict of output name to array
+    """
+    r = np.ascontiguousarray(radius, dtype=dtype)
+    if workers is None:
+        workers = getattr(executor, '_max_workers', None) or os.cpu_count()
+    if len(r) < min_rows or workers < 2:
+        return geometry_kernel(r, outputs, dtype)
+
+    bounds = np.linspace(0, len(r), workers + 1).astype(int)
+    chunks = list(zip(bounds[:-1], bounds[1:]))
+
+    if executor == 'thread':
+        with futures.ThreadPoolExecutor(workers) as pool:
+            return _run_threads(pool, r, outputs, dtype, chunks)
+    if executor == 'process':
+        with futures.ProcessPoolExecutor(workers) as pool:
+            return _run_processes(pool, r, outputs, dtype, chunks)
+    if isinstance(executor, futures.ThreadPoolExecutor):
+        return _run_threads(executor, r, outputs, dtype, chunks)
+    if isinstance(executor, futures.Executor):
+        return _run_processes(executor, r, outputs, dtype, chunks)
+    raise ValueError("executor must be 'thread', 'process' or an Executor, "
+                     "not {!r}".format(executor))
+
+
+def _run_threads(pool, r, outputs, dtype, chunks):
+    """Computes each chunk into its slice of the output arrays."""
+    results = {name: np.empty(r.shape, dtype=dtype) for name in outputs}
+
+    def run(chunk):
+        start, stop = chunk
+        geometry_kernel(r[start:stop], outputs, dtype,
+                        out={name: values[start:stop]
+                             for name, values in results.items()})
+
+    # list() waits for every chunk and raises the first error
+    list(pool.map(run, chunks))
+    return results
+
+
+def _run_processes(pool, r, outputs, dtype, chunks):
+    """
+    Computes each chunk in a worker process, with the radius and the
+    outputs held in shared memory blocks
+    """
+    names = ('radius',) + tuple(outputs)
+    blocks = {}
+    try:
+        for name in names:
+            blocks[name] = shared_memory.SharedMemory(create=True,
+                                                      size=max(r.nbytes, 1))
+        np.ndarray(r.shape, dtype, buffer=blocks['radius'].buf)[:] = r
+
+        block_names = {name: block.name for name, block in blocks.items()}
+        tasks = [(block_names, len(r), np.dtype(dtype).str, tuple(outputs),
+                  start, stop) for start, stop in chunks]
+        list(pool.map(_process_chunk, tasks))
+
+        # Copy out so the blocks can be released before returning
+        return {name: np.ndarray(r.shape, dtype, buffer=blocks[name].buf).copy()
+                for name in outputs}
+    finally:
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+
+
+def _process_chunk(task):
+    """Worker side of _run_processes for one chunk."""
+    block_names, length, dtype, outputs, start, stop = task
+    blocks = {name: shared_memory.SharedMemory(name=block_name)
+              for name, block_name in block_names.items()}
+    try:
+        arrays = {name: np.ndarray((length,), dtype, buffer=block.buf)
+                  for name, block in blocks.items()}
+        geometry_kernel(arrays['radius'][start:stop], outputs, dtype,
+                        out={name: arrays[name][start:stop]
+                             for name in outputs})
+        del arrays
+    finally:
+        for block in blocks.values():
+            block.close()
+
+
+def measure_crossover(sizes=None, executor='thread', workers=None,
+                      outputs=OUTPUTS, repeats=5):
+    """
+    Times the serial and the chunked kernel over a range of sizes
+    Input:
+        sizes -- row counts to try, in increasing order.  Default is
+                 powers of 4 from 1,000 to about 16 million
+        executor, workers -- as for parallel_geometry_kernel.  A pool
+                             is started once and reused for every size
+        outputs -- measurements to calculate
+        repeats -- best of this many runs is kept for each size
+    Output:
+        (crossover, timings) where crossover is the smallest size at
+        which the chunked kernel was faster, or None if it never was,
+        and timings is a list of (size, serial seconds, parallel seconds)
+    """
+    if sizes is None:
+        sizes = [1000 * 4 ** i for i in range(8)]
+    workers = workers or os.cpu_count()
+    pool_class = {'thread': futures.ThreadPoolExecutor,
+                  'process': futures.ProcessPoolExecutor}[executor]
+
+    def best(func):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    timings = []
+    crossover = None
+    with pool_class(workers) as pool:
+        for size in sizes:
+            r = np.random.default_rng(0).random(size)
+            serial = best(lambda: geometry_kernel(r, outputs))
+            parallel = best(lambda: parallel_geometry_kernel(
+                r, outputs, executor=pool, workers=workers, min_rows=0))
+            timings.append((size, serial, parallel))
+            if crossover is None and parallel < serial:
+                crossover = size
+    return crossover, timings
@@ -0,0 +1,126 @@
+"""
+Partition at a time geometry calculations over Parquet datasets.
+
+Radius tables that are bigger than memory are read one file of the
+dataset at a time, in record batches, and each batch is written straight
+to the matching file of the output dataset with the derived columns
+appended, so only one batch is held in memory at once.  The output keeps
+the directory layout of the input, including hive style partition
+directories.
+
+pyarrow is needed for this module and is imported when it is first used.
+"""
+
+import os
+import time
+
+from render_tools.lazy_import import lazy_import
+
+from .geometry_kernels import OUTPUTS, geometry_kernel
+
+np = lazy_import('numpy')
+
+
+def stream_geometry_calculations(source, destination, radius='radius',
+                                 outputs=OUTPUTS, dtype='float64',
+                                 batch_size=1_000_000, progress=None):
+    """
+    Calculates circle and sphere measurements for every row of a Parquet
+    dataset and writes the rows with the new columns to another dataset
+    Input:
+        source -- directory (or single file) of the input Parquet dataset
+        destination -- directory the output dataset is written to.  Each
+                       input file is written to the same relative path
+        radius -- column name containing the radius values
+        outputs -- names of the columns to add, any of
+                   'circumference', 'area', 'surface_area', 'volume'
+        dtype -- float dtype of the new columns
+        batch_size -- most rows read and held in memory at once
+        progress -- optional function called with the report of each
+                    partition as soon as it is written
+    Output:
+        list of one report per partition, a dict of the input 'partition'
+        and output 'path', the number of 'rows', the 'seconds' taken,
+        'rows_per_sec' and the 'peak_rss' in bytes while it was processed
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('stream_geometry_calculations needs pyarrow, '
+                          'install it with pip install pyarrow')
+
+    dataset = ds.dataset(source, format='parquet')
+    root = source if os.path.isdir(source) else os.path.dirname(source)
+    reports = []
+    for fragment in dataset.get_fragments():
+        in_schema = fragment.physical_schema
+        if radius not in in_schema.names:
+            raise IndexError('Radius column {} not in {}'
+                             .format(radius, fragment.path))
+        keep = [name for name in in_schema.names if name not in outputs]
+        out_schema = pa.schema([in_schema.field(name) for name in keep]
+                               + [pa.field(name, pa.from_numpy_dtype(
+                                   np.dtype(dtype))) for name in outputs])
+
+        path = os.path.join(destination,
+                            os.path.relpath(fragment.path, root))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        _reset_peak_rss()
+        start = time.perf_counter()
+        rows = 0
+        with pq.ParquetWriter(path, out_schema) as writer:
+            for batch in fragment.to_batches(batch_size=batch_size):
+                r = batch.column(radius).to_numpy(zero_copy_only=False)
+                results = geometry_kernel(r, outputs, dtype)
+                columns = [batch.column(name) for name in keep]
+                columns += [pa.array(results[name]) for name in outputs]
+                writer.write_batch(pa.RecordBatch.from_arrays(
+                    columns, schema=out_schema))
+                rows += batch.num_rows
+        seconds = time.perf_counter() - start
+
+        report = {
+            'partition': fragment.path,
+            'path': path,
+            'rows': rows,
+            'seconds': seconds,
+            'rows_per_sec': rows / seconds if seconds else float('inf'),
+            'peak_rss': _peak_rss(),
+        }
+        reports.append(report)
+        if progress is not None:
+            progress(report)
+    return reports
+
+
+def _reset_peak_rss():
+    """
+    Resets the peak resident set size of this process where Linux allows
+    it, so that each partition reports its own peak
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss():
+    """
+    Peak resident set size of this process in bytes, since the last
+    reset if it could be done, otherwise since the process started
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
@@ -3,19 +3,33 @@ An example pandas dataframe extension that can be added
 and shared easily using the pdext framework
 """
 
-from math import pi
+from .geometry_kernels import add_columns, geometry_kernel
+from .parallel_kernels import parallel_geometry_kernel
 
-def sphere_calculations(df, radius='radius'):
+def sphere_calculations(df, radius='radius', dtype='float64',
+                        executor=None, workers=None):
     """
-    Calculates the circumference and area of a circle 
+    Calculates the surface area and volume of a sphere 
     given a column of radius and adds the result to the
     dataframe
     Input:
         df -- dataframe
         radius -- column name containing the radius values
+        dtype -- float dtype of the new columns, 'float32' halves
+                 the memory used
+        executor -- None to run on one core, or 'thread', 'process'
+                    or a running executor to split the radius into
+                    chunks computed in parallel, see parallel_kernels.
+                    Frames shorter than PARALLEL_MIN_ROWS run serially
+        workers -- number of chunks to split the radius into
     """
     if radius not in df.columns:
-        raise IndexError('Radius column {} not in dataframe')
+        raise IndexError('Radius column {} not in dataframe'.format(radius))
 
-    df['surface_area'] = 4 * pi * df[radius] ** 2
-    df['volume'] = (4 / 3) * pi * df[radius] ** 3
\ No newline at end of file
+    outputs = ('surface_area', 'volume')
+    if executor is None:
+        results = geometry_kernel(df[radius], outputs, dtype)
+    else:
+        results = parallel_geometry_kernel(df[radius], outputs, dtype,
+                                           executor, workers)
+    add_columns(df, results)
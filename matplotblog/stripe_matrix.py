@@ -0,0 +1,221 @@
+"""
+Warming stripes for many series at once, drawn as a single image.
+
+Every series becomes one row of stripes.  Each is centred on its own
+reference value and scaled by its own colour limit, as heat_stripes would
+do for it alone, but the whole set is normalised in a few array
+operations and drawn with one imshow, so thousands of series take about
+as long to draw as one.
+"""
+
+from contextlib import nullcontext
+
+from render_tools.lazy_import import lazy_import
+from render_tools.scale_stats import ScaleStats
+
+from .warm_stripes import STRIPE_COLOURS
+
+mpl = lazy_import('matplotlib')
+backend_agg = lazy_import('matplotlib.backends.backend_agg')
+mcolors = lazy_import('matplotlib.colors')
+mfigure = lazy_import('matplotlib.figure')
+np = lazy_import('numpy')
+
+_NO_PHASE = nullcontext()
+
+
+def stripe_matrix(df, cols=None, by=None, value=None, index=None,
+                  reference=None, clim=None, clip=None, first=None,
+                  last=None, sort=None, cmap=None, fillcolor='white',
+                  reducer='mean', pixels=None, figsize=None, fig=None,
+                  ax=None, profile=None):
+    """
+    Creates a matrix of heat stripes, one row per series.
+
+    Input:
+        df -- dataframe in wide form, one column per series, or in long
+              form with a `by` column naming the series of each row
+        cols -- for wide data, the columns to draw.  Default is all of
+                them, other than index
+        by -- for long data, the column (or list of columns) that names
+              the series of each row.  Rows with the same series and
+              index value are averaged
+        value -- for long data, the column holding the values
+        index -- the name of the column that orders the stripes.  If None
+                 the existing index to df is used
+        reference -- the value each series is centred on: None for its
+                     middle row, as in heat_stripes, 'mean' for its mean,
+                     or a string of the form 'A:B' for its mean over the
+                     index rows A to B
+        clim -- a numeric value +/- the reference value that controls the
+                colour limit of every series.  Default is 2 standard
+                deviations of each series, or see clip
+        clip -- percentiles such as (2, 98).  If given and clim is None,
+                each series' clim is the distance from its reference to
+                the further of its two percentiles.  They are
+                approximated in one pass with a bounded quantile sketch
+        first -- First index row to use in stripes.  If None, then first row
+        last -- Last index row to use in stripes.  If None, then last row
+        sort -- None to keep the order of the series, or 'mean' or
+                'trend' (the least squares slope of each series) to put
+                the highest at the top
+        cmap -- colormap, or colormap name, for the stripes.  Default is
+                the red/blue scale of heat_stripes
+        fillcolor -- colour of index rows a series has no value for
+        reducer -- how index rows are combined when there are more than
+                   `pixels`: 'mean', 'min' or 'max'
+        pixels -- the most stripes drawn along each row.  Default is the
+                  width of the axes in pixels
+        figsize -- size of a new figure.  Default is 10 inches wide and
+                   one pixel (at 100 dpi) high per series, at least 1 inch
+        fig -- a matplotlib Figure to draw on, filled by a new axes.  If
+               None, a new Figure with an Agg canvas is made, without
+               using pyplot
+        ax -- an Axes to draw on instead of making a new one
+        profile -- called with the name of each phase, 'aggregate',
+                   'scale', 'figure', 'artists' and 'layout', and used as
+                   a context manager around it, such as render_tools'
+                   PhaseProfile
+    Output:
+        fig -- a matplotlib figure of the stripes
+        rows -- the series names from the top row to the bottom
+    """
+    phase = profile or _no_phase
+
+    with phase('aggregate'):
+        keys = df.index if index is None else df[index]
+        if by is not None:
+            data = df[value].groupby([keys] + _as_list(by, df)).mean()
+            data = data.unstack(list(range(1, data.index.nlevels)))
+        else:
+            if cols is None:
+                cols = [c for c in df.columns if c != index]
+            data = df[cols].set_axis(keys, axis=0)
+        data = data.sort_index().loc[first:last]
+        values = data.to_numpy(dtype=float)
+        rows = data.columns
+
+    with phase('scale'):
+        centre = _references(values, data.index, reference)
+        if clim is not None:
+            spread = np.full(len(centre), float(clim))
+        elif clip is not None:
+            # the same one pass quantile sketch heat_stripes clips with
+            stats = ScaleStats().add(values)
+            low, high = np.array([stats.limits(i, clip)
+                                  for i in range(len(centre))]).T
+            spread = np.fmax(high - centre, centre - low)
+        else:
+            spread = 2 * np.nanstd(values, axis=0, ddof=1)
+        spread = np.where(spread > 0, spread, np.inf)
+
+        if sort is not None:
+            order = np.argsort(-_sort_keys(values, sort), kind='stable')
+            values = values[:, order]
+            centre, spread, rows = centre[order], spread[order], rows[order]
+
+    if cmap is None:
+        cmap = mcolors.ListedColormap(STRIPE_COLOURS)
+    cmap = mpl.colormaps.get_cmap(cmap).with_extremes(bad=fillcolor)
+
+    with phase('figure'):
+        if ax is not None:
+            fig = ax.figure
+        else:
+            if fig is None:
+                if figsize is None:
+                    figsize = (10, max(1, len(rows) / 100))
+                fig = mfigure.Figure(figsize=figsize)
+                backend_agg.FigureCanvasAgg(fig)
+            ax = fig.add_axes([0, 0, 1, 1])
+        ax.set_axis_off()
+
+    with phase('aggregate'):
+        if pixels is None:
+            pixels = int(round(ax.bbox.width))
+        values = _bin_rows(values, pixels, reducer)
+
+    with phase('artists'):
+        # every series is scaled to -1..1 between its own colour limits
+        with np.errstate(invalid='ignore'):
+            scaled = (values - centre) / spread
+        ax.imshow(np.ma.masked_invalid(scaled.T), cmap=cmap, vmin=-1, vmax=1,
+                  extent=(0, values.shape[0], 0, values.shape[1]),
+                  aspect='auto', interpolation='nearest')
+
+    with phase('layout'):
+        ax.set_xlim(0, values.shape[0])
+        ax.set_ylim(0, values.shape[1])
+
+    return fig, rows
+
+
+def _as_list(by, df):
+    return [df[c] for c in ([by] if isinstance(by, str) else by)]
+
+
+def _references(values, index, reference):
+    """Reference value of every series (column) of values"""
+    if reference is None:
+        # the middle valid row of each series, as heat_stripes uses
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+        middle = np.argmax(np.cumsum(valid, axis=0) > count // 2, axis=0)
+        centre = values[middle, np.arange(values.shape[1])]
+        return np.where(count > 0, centre, np.nan)
+    if reference == 'mean':
+        rows = slice(None)
+    else:
+        first_ref, last_ref = reference.split(':')
+        if index.dtype.kind in 'iu':
+            first_ref, last_ref = int(first_ref), int(last_ref)
+        rows = index.slice_indexer(first_ref, last_ref)
+    with np.errstate(invalid='ignore'):
+        return np.nanmean(values[rows], axis=0)
+
+
+def _sort_keys(values, sort):
+    """Mean or least squares slope of every series, NaN sorted last"""
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=0)
+    y = np.where(valid, values, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = y.sum(axis=0) / count
+        if sort == 'mean':
+            keys = mean
+        elif sort == 'trend':
+            x = np.where(valid, np.arange(len(values))[:, np.newaxis], 0.0)
+            dx = np.where(valid, x - x.sum(axis=0) / count, 0.0)
+            keys = (dx * (y - mean)).sum(axis=0) / (dx ** 2).sum(axis=0)
+        else:
+            raise ValueError("sort must be None, 'mean' or 'trend', "
+                             "not {!r}".format(sort))
+    return np.where(np.isnan(keys), -np.inf, keys)
+
+
+def _bin_rows(values, pixels, reducer='mean'):
+    """
+    Reduce the index rows to at most `pixels` by combining runs of
+    neighbouring rows of every series with 'mean', 'min' or 'max',
+    ignoring missing values.
+    """
+    if len(values) <= pixels:
+        return values
+    starts = np.arange(pixels) * len(values) // pixels
+    valid = ~np.isnan(values)
+    if reducer == 'mean':
+        total = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        count = np.add.reduceat(valid, starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(count > 0, total / count, np.nan)
+    elif reducer == 'min':
+        return np.fmin.reduceat(values, starts)
+    elif reducer == 'max':
+        return np.fmax.reduceat(values, starts)
+    raise ValueError("reducer must be 'mean', 'min' or 'max', "
+                     "not {!r}".format(reducer))
+
+
+def _no_phase(name):
+    """Profile used when none is given, which records nothing"""
+    return _NO_PHASE
@@ -0,0 +1,59 @@
+"""
+Animated heat stripes that grow a few stripes per frame.
+
+The figure is built once by heat_stripes.  Each frame only swaps the array
+of the existing PatchCollection (or image, in raster mode) so frames are
+cheap, and frames are streamed to disk as they are drawn so memory stays
+flat however long the animation is.
+"""
+
+from render_tools.lazy_import import lazy_import
+
+from .warm_stripes import heat_stripes
+
+animation = lazy_import('matplotlib.animation')
+np = lazy_import('numpy')
+
+
+def animate_stripes(df, col, step=1, interval=50, **kwargs):
+    """
+    Animate heat stripes appearing from left to right.
+
+    Input:
+        df, col -- as for heat_stripes
+        step -- number of new stripes shown in each frame
+        interval -- delay between frames in milliseconds when shown on
+                    screen
+        kwargs -- all other keyword arguments are passed to heat_stripes.
+                  The colour scale is fixed from the whole series.
+    Output:
+        anim -- a blitted matplotlib FuncAnimation.  Use
+                render_tools.animation.save_animation to write it to a
+                GIF or a sequence of PNG files
+    """
+    fig = heat_stripes(df, col, **kwargs)
+    ax = fig.axes[0]
+    if ax.collections:
+        stripes = ax.collections[0]
+        values = np.ma.asarray(stripes.get_array()).copy()
+
+        def show(masked):
+            stripes.set_array(masked)
+    else:
+        stripes = ax.images[0]
+        values = np.ma.asarray(stripes.get_array())[0].copy()
+
+        def show(masked):
+            stripes.set_data(masked[np.newaxis, :])
+
+    position = np.arange(len(values))
+
+    def update(num):
+        show(np.ma.masked_where(position >= num, values))
+        return [stripes]
+
+    frames = list(range(step, len(values), step)) + [len(values)]
+    return animation.FuncAnimation(fig, update, frames=frames,
+                                   init_func=lambda: update(0),
+                                   interval=interval, blit=True)
+
@@ -1,16 +1,42 @@
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
-from matplotlib.collections import PatchCollection
-from matplotlib.colors import ListedColormap
+from contextlib import nullcontext
+
+from render_tools.lazy_import import lazy_import
+from render_tools.scale_stats import ScaleStats
+
+
+backend_agg = lazy_import('matplotlib.backends.backend_agg')
+mcollections = lazy_import('matplotlib.collections')
+mcolors = lazy_import('matplotlib.colors')
+mfigure = lazy_import('matplotlib.figure')
+mpatches = lazy_import('matplotlib.patches')
+np = lazy_import('numpy')
+
+_NO_PHASE = nullcontext()
+
+# the colors of the default colormap come from http://colorbrewer2.org
+# the 8 more saturated colors from the 9 blues / 9 reds
+STRIPE_COLOURS = [
+    '#08306b', '#08519c', '#2171b5', '#4292c6',
+    '#6baed6', '#9ecae1', '#c6dbef', '#deebf7',
+    '#fee0d2', '#fcbba1', '#fc9272', '#fb6a4a',
+    '#ef3b2c', '#cb181d', '#a50f15', '#67000d',
+]
 
 
 def heat_stripes(df, col, reference = None, clim = None, 
-                     first=None, last=None,index=None, cmap = None):
+                     first=None, last=None,index=None, cmap = None,
+                     mode='patches', reducer='mean', pixels=None,
+                     fig=None, ax=None, profile=None, clip=None,
+                     figsize=(10, 1)):
     """
     Creates a stripped heatmap.
     Inspired by Maximilian Nöthe -- https://matplotlib.org/matplotblog/posts/warming-stripes/
 
     Input:
+        df -- a dataframe, or a render_tools DailyStore (or any object
+              with its frame method) whose days first to last are
+              read as a view of its file.  A store's index is dates, so
+              it is always drawn in 'raster' mode
         col -- the name of the column to be heatstriped.  Must be
                numeric and missing values are dropped
         reference -- A string of the form 'A:B' that identifies the index
@@ -18,32 +44,72 @@ def heat_stripes(df, col, reference = None, clim = None,
                      If None, the row in the middle of col is used
         clim  -- a numeric value +/- the reference value that controls 
                  the colour limit of the stripes.  Default is 2 standard
-                 deviations of the values in col
+                 deviations of the values in col, or see clip
         first -- First index row to use in stripes.  If None, then first row
         last -- Last index row to use in stripes.  If None, then last row
         index -- the name of the reference column.  If None the existing
                  index to df is used.
         cmap -- a ListedColormap pallette for the striped output colour.
                 Default is a red/blue scale  
+        mode -- 'patches' draws a Rectangle for each row, which needs an
+                integer index that is contiguous with the data, so it is
+                not used for a store.
+                'raster' draws the rows as a one row image, one stripe per
+                row in index order, so any sorted index (including dates)
+                can be used and millions of rows draw quickly
+        reducer -- for 'raster' mode, how rows are combined when there
+                   are more rows than pixels: 'mean', 'min' or 'max'
+        pixels -- for 'raster' mode, the most stripes to draw.  Default is
+                  the width of the axes in pixels
+        fig -- a matplotlib Figure to draw on, filled by a new axes.  If
+               None, a new Figure of figsize with an Agg canvas is made,
+               without using pyplot
+        ax -- an Axes to draw on instead of making a new one
+        profile -- called with the name of each phase, 'aggregate',
+                   'figure', 'artists' and 'layout', and used as a
+                   context manager around it, such as render_tools'
+                   PhaseProfile
+        clip -- percentiles such as (2, 98).  If given and clim is None,
+                clim is the distance from the reference to the further
+                of the two, so that a few extreme rows do not wash out
+                the rest.  They are approximated in one pass with a
+                bounded quantile sketch
+        figsize -- size in inches of a new figure
     Output:
         fig -- a matplotlib plot of the heat_stripes
 
     """
-    if index is None:
-        data = df.loc[:, col].dropna()
-    else:
-        data = df[[index, col]].set_index(index)
-        data = data.loc[:, col].dropna()
-
-    # calculate mean value of the reference rows
-    if reference is None:
-        reference = data.reset_index().loc[len(data)//2][col].mean()
-    else:
-        first_ref, last_ref = [int(r) for r in reference.split(':')]
-        reference = data.loc[first_ref:last_ref].mean()
-
-    if clim is None:
-        clim = 2 * data.std()
+    phase = profile or _no_phase
+
+    with phase('aggregate'):
+        # a daily store, told apart from a frame by its frame() method
+        if callable(getattr(type(df), 'frame', None)):
+            df, index = df.frame([col], first, last), None
+            mode = 'raster'
+        if index is None:
+            data = df.loc[:, col].dropna()
+        else:
+            data = df[[index, col]].set_index(index)
+            data = data.loc[:, col].dropna()
+
+        # calculate mean value of the reference rows
+        if reference is None:
+            reference = float(data.iloc[len(data)//2])
+        else:
+            first_ref, last_ref = reference.split(':')
+            if data.index.dtype.kind in 'iu':
+                first_ref, last_ref = int(first_ref), int(last_ref)
+            reference = data.loc[first_ref:last_ref].mean()
+
+        # spread of the values from one pass over them
+        if clim is None:
+            stats = ScaleStats(sketch_size=None if clip is None else 1024)
+            stats.add(data.to_numpy(dtype=float))
+            if clip is None:
+                clim = 2 * stats.std()
+            else:
+                low, high = stats.limits(clip=clip)
+                clim = max(high - reference, reference - low)
 
     if first is None:
         first = data.index[0]
@@ -51,33 +117,75 @@ def heat_stripes(df, col, reference = None, clim = None,
         last = data.index[-1]
     
     if cmap is None:
-        # the colors in this colormap come from http://colorbrewer2.org
-        # the 8 more saturated colors from the 9 blues / 9 reds
-        cmap = ListedColormap([
-            '#08306b', '#08519c', '#2171b5', '#4292c6',
-            '#6baed6', '#9ecae1', '#c6dbef', '#deebf7',
-            '#fee0d2', '#fcbba1', '#fc9272', '#fb6a4a',
-            '#ef3b2c', '#cb181d', '#a50f15', '#67000d',
-        ])
+        cmap = mcolors.ListedColormap(STRIPE_COLOURS)
 
-    fig = plt.figure(figsize=(10, 1))
+    with phase('figure'):
+        if ax is not None:
+            fig = ax.figure
+        else:
+            if fig is None:
+                fig = mfigure.Figure(figsize=figsize)
+                backend_agg.FigureCanvasAgg(fig)
+            ax = fig.add_axes([0, 0, 1, 1])
+        ax.set_axis_off()
 
-    ax = fig.add_axes([0, 0, 1, 1])
-    ax.set_axis_off()
+    if mode == 'raster':
+        with phase('aggregate'):
+            data = data.loc[first:last]
+            if pixels is None:
+                pixels = int(round(ax.bbox.width))
+            stripes = _bin_stripes(data.to_numpy(dtype=float), pixels, reducer)
+        with phase('artists'):
+            ax.imshow(stripes[np.newaxis, :], cmap=cmap,
+                      vmin=reference - clim, vmax=reference + clim,
+                      extent=(0, len(stripes), 0, 1), aspect='auto',
+                      interpolation='nearest')
+        with phase('layout'):
+            ax.set_ylim(0, 1)
+            ax.set_xlim(0, len(stripes))
+        return fig
+    elif mode != 'patches':
+        raise ValueError("mode must be 'patches' or 'raster', "
+                         "not {!r}".format(mode))
 
-    # create a collection with a rectangle for each row
-    col = PatchCollection([
-        Rectangle((y, 0), 1, 1)
-        for y in range(first, last + 1)
-    ])
+    with phase('artists'):
+        # create a collection with a rectangle for each row
+        col = mcollections.PatchCollection([
+            mpatches.Rectangle((y, 0), 1, 1)
+            for y in range(first, last + 1)
+        ])
 
-    # set data, colormap and color limits
-    col.set_array(data)
-    col.set_cmap(cmap)
-    col.set_clim(reference - clim, reference + clim)
-    ax.add_collection(col)
+        # set data, colormap and color limits
+        col.set_array(data)
+        col.set_cmap(cmap)
+        col.set_clim(reference - clim, reference + clim)
+        ax.add_collection(col)
 
-    ax.set_ylim(0, 1)
-    ax.set_xlim(first, last + 1)
+    with phase('layout'):
+        ax.set_ylim(0, 1)
+        ax.set_xlim(first, last + 1)
 
     return fig
+
+
+def _no_phase(name):
+    """Profile used when none is given, which records nothing"""
+    return _NO_PHASE
+
+
+def _bin_stripes(values, pixels, reducer='mean'):
+    """
+    Reduce values to at most `pixels` stripes by combining runs of
+    neighbouring values with 'mean', 'min' or 'max'.
+    """
+    if len(values) <= pixels:
+        return values
+    starts = np.arange(pixels) * len(values) // pixels
+    if reducer == 'mean':
+        return np.add.reduceat(values, starts) / np.diff(np.r_[starts, len(values)])
+    elif reducer == 'min':
+        return np.minimum.reduceat(values, starts)
+    elif reducer == 'max':
+        return np.maximum.reduceat(values, starts)
+    raise ValueError("reducer must be 'mean', 'min' or 'max', "
+                     "not {!r}".format(reducer))
@@ -0,0 +1,76 @@
+"""
+Client for the render service, see service.py for the protocol.
+
+Example:
+    >>> async with RenderClient('127.0.0.1', 8765) as client:
+    ...     png = await client.render('wedge_plot', 'trophies',
+    ...                               figsize=[10, 10])
+"""
+
+import asyncio
+import json
+
+
+class RenderError(Exception):
+    """A job the service could not render.  status is 'busy' or 'error'"""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RenderClient:
+    """
+    One connection to a render service, used for a job at a time.
+
+    Input:
+        host, port -- address of the service
+    """
+    def __init__(self, host='127.0.0.1', port=8765):
+        self.host = host
+        self.port = port
+        self.last_reply = None
+        self._reader = self._writer = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(
+            self.host, self.port)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._reader = self._writer = None
+
+    async def render(self, extension, data, format='png', **kwargs):
+        """
+        Image bytes of an extension drawn from a dataset of the service,
+        with kwargs (which must be JSON) passed to it.  The timings the
+        service sent are kept in last_reply.  Raises RenderError if the
+        service is busy or the job fails.
+        """
+        reply = await self._request({'op': 'render', 'extension': extension,
+                                     'data': data, 'kwargs': kwargs,
+                                     'format': format})
+        if reply['status'] != 'ok':
+            raise RenderError(reply['status'], reply.get('error'))
+        return await self._reader.readexactly(reply['bytes'])
+
+    async def metrics(self):
+        """The service's metrics summary"""
+        return (await self._request({'op': 'metrics'}))['metrics']
+
+    async def _request(self, request):
+        self._writer.write(json.dumps(request).encode() + b'\n')
+        await self._writer.drain()
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError('The render service closed the connection')
+        self.last_reply = json.loads(line)
+        return self.last_reply
@@ -0,0 +1,309 @@
+"""
+Asyncio render service for the extensions.
+
+Rendering blocks, so the event loop only reads requests and writes
+responses, and every job is drawn by a pool of worker processes that
+were warmed up when the service started (see worker.py).  A slow
+year_heatmap then holds one worker rather than every request.
+
+- Identical jobs (same extension, dataset, arguments and format) that
+  arrive while one of them is being drawn share its result rather than
+  drawing it again.
+- At most `max_pending` distinct jobs are queued or drawing at once.
+  Jobs beyond that are answered straight away with status 'busy', so
+  callers can back off instead of piling up work.
+- The queue wait, render time and total latency of every job are kept,
+  and summarised by `metrics()`.
+- If a worker dies, the jobs it broke are answered with an error and a
+  fresh pool of warmed workers takes over.
+
+Protocol, over TCP: each request is one line of JSON, such as
+
+    {"op": "render", "extension": "year_heatmap", "data": "sales",
+     "kwargs": {"value_cols": "amount", "layout": "single"},
+     "format": "png"}
+
+where "data" is the name of a dataset given to the service.  The reply
+is one line of JSON, {"status": "ok", "bytes": n, ...}, followed by the
+n bytes of the image when the status is 'ok'.  {"op": "metrics"} is
+answered with the metrics summary.  A connection can send any number
+of requests, one after the other.  A request line longer than
+`max_request` bytes is answered with an error and the connection closed.
+
+Usage, from the top of the repository:
+
+    python -m render_service.service --port 8765 --workers 4 \\
+        --data sales=data/sales.parquet --data rain=data/rain.days
+"""
+
+import argparse
+import asyncio
+from collections import deque, namedtuple
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+import json
+import math
+import sys
+import time
+
+from .worker import EXTENSIONS, ping, render_job, warm
+
+JobMetric = namedtuple('JobMetric', [
+    'extension',  # extension name
+    'status',     # 'ok', 'busy' or 'error'
+    'coalesced',  # True if the result of an identical job was shared
+    'queued',     # seconds waiting for a worker, None unless drawn
+    'render',     # seconds loading data and drawing, None unless drawn
+    'latency',    # seconds from request to reply
+    'bytes',      # size of the image, 0 unless ok
+])
+
+
+class RenderService:
+    """
+    Render server backed by a pool of worker processes.
+
+    Input:
+        datasets -- dict of dataset name to file, see worker.load_data
+        workers -- number of worker processes
+        max_pending -- most distinct jobs queued or drawing at once
+        history -- number of recent jobs kept for metrics
+        max_request -- longest request line accepted, in bytes
+    Example:
+        >>> service = RenderService({'sales': 'sales.parquet'}, workers=2)
+        >>> port = await service.start('127.0.0.1', 0)
+        >>> ...
+        >>> await service.close()
+    """
+    def __init__(self, datasets, workers=2, max_pending=16, history=1000,
+                 max_request=2 ** 20):
+        self.datasets = dict(datasets)
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_request = max_request
+        self.jobs = deque(maxlen=history)
+        self._pool = None
+        self._restart = None
+        self._server = None
+        self._inflight = {}
+
+    async def start(self, host='127.0.0.1', port=0):
+        """
+        Start and warm up the workers, then listen on host and port
+        Output:
+            the port listened on, useful when port is 0
+        """
+        self._pool = await self._start_pool()
+        self._server = await asyncio.start_server(self._connection, host, port,
+                                                  limit=self.max_request)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def _start_pool(self):
+        """A pool of workers that are all started and warmed up"""
+        loop = asyncio.get_running_loop()
+        pool = futures.ProcessPoolExecutor(self.workers, initializer=warm)
+        # Holding every worker briefly makes the pool start all of them now
+        await asyncio.gather(*[loop.run_in_executor(pool, ping, 0.2)
+                               for _ in range(self.workers)])
+        return pool
+
+    def _replace_pool(self, broken):
+        """
+        Start a new pool in the background in place of one broken by a dead
+        worker.  Jobs are answered 'busy' until it is ready.
+        """
+        if self._pool is not broken:
+            # Replaced already, after another job that failed with it
+            return
+        self._pool = None
+        broken.shutdown(wait=False)
+        self._restart = asyncio.ensure_future(self._restart_pool())
+
+    async def _restart_pool(self):
+        self._pool = await self._start_pool()
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """Stop listening, finish the jobs in hand and stop the workers"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._restart is not None:
+            await asyncio.gather(self._restart, return_exceptions=True)
+        if self._pool is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._pool.shutdown)
+
+    async def render(self, extension, data, kwargs=None, format='png'):
+        """
+        Render one job in the pool
+        Output:
+            (status, image bytes or error message, JobMetric)
+        """
+        received = time.time()
+        kwargs = kwargs or {}
+        try:
+            if extension not in EXTENSIONS:
+                raise ValueError('Unknown extension {!r}'.format(extension))
+            if data not in self.datasets:
+                raise ValueError('Unknown dataset {!r}'.format(data))
+            key = (extension, data, json.dumps(kwargs, sort_keys=True), format)
+        except (TypeError, ValueError) as e:
+            return self._done('error', str(e), extension, received)
+
+        # The job, and the pool drawing it, of an identical request
+        job, pool = self._inflight.get(key, (None, self._pool))
+        coalesced = job is not None
+        if not coalesced:
+            if len(self._inflight) >= self.max_pending:
+                return self._done('busy', 'Render queue is full, retry later',
+                                  extension, received)
+            if pool is None:
+                return self._done('busy', 'Workers are restarting, retry '
+                                  'later', extension, received)
+            loop = asyncio.get_running_loop()
+            try:
+                job = loop.run_in_executor(pool, render_job, extension,
+                                           self.datasets[data], kwargs,
+                                           format)
+            except BrokenProcessPool as e:
+                self._replace_pool(pool)
+                return self._done('error', 'BrokenProcessPool: {}'.format(e),
+                                  extension, received)
+            self._inflight[key] = job, pool
+            job.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        try:
+            image, started, render = await asyncio.shield(job)
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._replace_pool(pool)
+            return self._done('error', '{}: {}'.format(type(e).__name__, e),
+                              extension, received, coalesced)
+        return self._done('ok', image, extension, received, coalesced,
+                          started - received, render)
+
+    def _done(self, status, result, extension, received, coalesced=False,
+              queued=None, render=None):
+        metric = JobMetric(extension, status, coalesced,
+                           None if queued is None else max(queued, 0.0),
+                           render, time.time() - received,
+                           len(result) if status == 'ok' else 0)
+        self.jobs.append(metric)
+        return status, result, metric
+
+    def metrics(self):
+        """
+        Summary of the recent jobs: counts by status, the number
+        coalesced, and latency percentiles in seconds
+        """
+        jobs = list(self.jobs)
+        summary = {
+            'jobs': len(jobs),
+            'ok': sum(j.status == 'ok' for j in jobs),
+            'busy': sum(j.status == 'busy' for j in jobs),
+            'error': sum(j.status == 'error' for j in jobs),
+            'coalesced': sum(j.coalesced for j in jobs),
+            'pending': len(self._inflight),
+        }
+        for name in ('latency', 'queued', 'render'):
+            values = [getattr(j, name) for j in jobs
+                      if j.status == 'ok' and getattr(j, name) is not None]
+            if values:
+                summary[name] = {'p50': _percentile(values, 50),
+                                 'p95': _percentile(values, 95),
+                                 'max': max(values)}
+        return summary
+
+    async def _connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Longer than max_request: the rest of the line cannot
+                    # be told apart from the next request, so stop here
+                    error = 'Request longer than {} bytes'.format(
+                        self.max_request)
+                    writer.write(json.dumps({'status': 'error',
+                                             'error': error}).encode() + b'\n')
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    op = request.get('op', 'render')
+                except (ValueError, AttributeError):
+                    request, op = {}, None
+
+                if op == 'render':
+                    status, result, metric = await self.render(
+                        request.get('extension'), request.get('data'),
+                        request.get('kwargs'), request.get('format', 'png'))
+                    reply = {'status': status, 'bytes': metric.bytes,
+                             'coalesced': metric.coalesced,
+                             'queued': metric.queued, 'render': metric.render,
+                             'latency': metric.latency}
+                    if status != 'ok':
+                        reply['error'] = result
+                    writer.write(json.dumps(reply).encode() + b'\n')
+                    if status == 'ok':
+                        writer.write(result)
+                elif op == 'metrics':
+                    writer.write(json.dumps({'status': 'ok',
+                                             'metrics': self.metrics()})
+                                 .encode() + b'\n')
+                else:
+                    writer.write(json.dumps({'status': 'error',
+                                             'error': 'Bad request'})
+                                 .encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def _percentile(values, q):
+    """Nearest rank percentile q of values"""
+    values = sorted(values)
+    return values[max(math.ceil(q / 100 * len(values)) - 1, 0)]
+
+
+async def _serve(args):
+    datasets = dict(d.split('=', 1) for d in args.data)
+    service = RenderService(datasets, args.workers, args.max_pending,
+                            max_request=args.max_request)
+    port = await service.start(args.host, args.port)
+    print('Render service on {}:{} with {} workers'.format(
+        args.host, port, args.workers))
+    try:
+        await service.serve_forever()
+    finally:
+        await service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--max-pending', type=int, default=16,
+                        help='most distinct jobs queued or drawing at once')
+    parser.add_argument('--max-request', type=int, default=2 ** 20,
+                        help='longest request line accepted, in bytes')
+    parser.add_argument('--data', action='append', default=[],
+                        metavar='NAME=PATH', help='a dataset jobs can use')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    sys.exit(main())
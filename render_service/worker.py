@@ -0,0 +1,110 @@
+"""
+Code run in the render service's worker processes.
+
+Each worker is warmed up once when the pool starts: matplotlib, pandas and
+the extensions are imported and a figure with text is drawn, so the font
+cache is loaded before the first job arrives.  A job names an extension
+and a dataset file; recently used datasets are kept loaded, and reloaded
+when their file changes.
+"""
+
+from collections import OrderedDict
+import importlib
+import os
+import time
+
+# Extensions the service can run, by name, and the module defining each
+EXTENSIONS = {
+    'year_heatmap': 'year_heatmap.year_heatmap',
+    'heat_stripes': 'matplotblog.warm_stripes',
+    'stripe_matrix': 'matplotblog.stripe_matrix',
+    'wedge_plot': 'wedge_plot.wedge_plot',
+}
+
+# Extensions that accept a DailyStore in place of a DataFrame
+STORE_READERS = {'year_heatmap', 'heat_stripes'}
+
+# Datasets kept loaded in each worker
+MAX_DATASETS = 8
+
+_datasets = OrderedDict()
+
+
+def warm():
+    """Pool initializer: import and exercise everything a job needs"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    import pandas  # noqa: F401
+
+    for name in EXTENSIONS:
+        extension(name)
+    fig = Figure(figsize=(1, 1))
+    FigureCanvasAgg(fig)
+    fig.text(0.5, 0.5, 'warm', weight='bold')
+    fig.canvas.draw()
+
+
+def ping(delay=0):
+    """Job that holds a worker for `delay` seconds, to start every worker"""
+    time.sleep(delay)
+    return os.getpid()
+
+
+def extension(name):
+    """The extension function called name"""
+    if name not in EXTENSIONS:
+        raise ValueError('Unknown extension {!r}, use one of {}'
+                         .format(name, ', '.join(sorted(EXTENSIONS))))
+    return getattr(importlib.import_module(EXTENSIONS[name]), name)
+
+
+def load_data(path, extension_name):
+    """
+    Data at path, read by its file extension: .parquet, .csv (first
+    column is the index, dates parsed), .pkl, or .days for a DailyStore,
+    for an extension that reads one
+    """
+    key = (path, extension_name, os.stat(path).st_mtime_ns)
+    if key in _datasets:
+        _datasets.move_to_end(key)
+        return _datasets[key]
+
+    import pandas as pd
+    suffix = os.path.splitext(path)[1]
+    if suffix == '.parquet':
+        data = pd.read_parquet(path)
+    elif suffix == '.csv':
+        data = pd.read_csv(path, index_col=0, parse_dates=True)
+    elif suffix == '.pkl':
+        data = pd.read_pickle(path)
+    elif suffix == '.days':
+        if extension_name not in STORE_READERS:
+            raise ValueError('{} does not read daily stores'
+                             .format(extension_name))
+        from render_tools.daily_store import DailyStore
+        data = DailyStore(path)
+    else:
+        raise ValueError('Cannot read data from {}'.format(path))
+
+    # Drop older versions of the file as well as the least recently used
+    for old in [k for k in _datasets if k[:2] == key[:2]]:
+        del _datasets[old]
+    _datasets[key] = data
+    while len(_datasets) > MAX_DATASETS:
+        _datasets.popitem(last=False)
+    return data
+
+
+def render_job(extension_name, path, kwargs, format):
+    """
+    Render one job
+    Output:
+        (image bytes, time.time() the job started, seconds it took)
+    """
+    from render_tools.figure_pool import render_png
+
+    start = time.time()
+    data = load_data(path, extension_name)
+    image = render_png(extension(extension_name), data, format=format,
+                       **kwargs)
+    return image, start, time.time() - start
@@ -0,0 +1,80 @@
+"""
+Writing the extensions' animations to disk a frame at a time.
+
+animate_stripes and animate_year_heatmap return blitted matplotlib
+animations.  `save_animation` streams their frames to a GIF or to one PNG
+file per frame, so memory stays flat however long the animation is.
+
+Example:
+    >>> anim = animate_stripes(df, 'temp', step=5)
+    >>> save_animation(anim, 'frames/{:05d}.png', fps=25)
+"""
+
+from functools import lru_cache
+
+from .lazy_import import lazy_import
+
+animation = lazy_import('matplotlib.animation')
+
+# Writers tried in turn for a single output file
+GIF_WRITERS = ('imagemagick', 'ffmpeg', 'pillow')
+
+
+def save_animation(anim, path, fps=10, dpi=None):
+    """
+    Write an animation to disk a frame at a time.
+
+    Input:
+        anim -- a matplotlib Animation
+        path -- a pattern with a format field such as 'frames/{:05d}.png'
+                writes one PNG per frame.  A '.gif' path is piped through
+                ImageMagick or ffmpeg when installed, otherwise Pillow is
+                used, which holds every frame in memory until the end
+        fps -- frames per second of the output
+        dpi -- resolution of the frames.  Default is the figure dpi
+    """
+    if '{' in path:
+        writer = _png_sequence_writer()(fps=fps)
+    else:
+        available = [name for name in GIF_WRITERS
+                     if animation.writers.is_available(name)]
+        if not available:
+            raise ValueError('No animation writer is available for {}, '
+                             'install one of {} or give a PNG path pattern '
+                             'such as frames/{{:05d}}.png'
+                             .format(path, ', '.join(GIF_WRITERS)))
+        writer = animation.writers[available[0]](fps=fps)
+    anim.save(path, writer=writer, dpi=dpi)
+
+
+def __getattr__(name):
+    # PNGSequenceWriter subclasses a matplotlib class, so it is only
+    # defined when it is first asked for
+    if name == 'PNGSequenceWriter':
+        return _png_sequence_writer()
+    raise AttributeError('module {!r} has no attribute {!r}'
+                         .format(__name__, name))
+
+
+@lru_cache(maxsize=None)
+def _png_sequence_writer():
+    class PNGSequenceWriter(animation.AbstractMovieWriter):
+        """
+        Movie writer that saves each frame straight to its own PNG file,
+        named by formatting the output path with the frame number.
+        """
+        def setup(self, fig, outfile, dpi=None):
+            super().setup(fig, outfile, dpi=dpi)
+            self._frame = 0
+
+        def grab_frame(self, **savefig_kwargs):
+            self.fig.savefig(self.outfile.format(self._frame), format='png',
+                             dpi=self.dpi, **savefig_kwargs)
+            self._frame += 1
+
+        def finish(self):
+            pass
+
+    PNGSequenceWriter.__module__ = __name__
+    PNGSequenceWriter.__qualname__ = 'PNGSequenceWriter'
+    return PNGSequenceWriter
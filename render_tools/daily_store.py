@@ -0,0 +1,276 @@
+"""
+Memory mapped on-disk store of daily data.
+
+A store is one file: a fixed size header, holding the start date, the
+column names, the dtype and the number of days written, followed by a
+column by day array that is opened with `np.memmap`.  Each column's days
+are contiguous, so the days of one column for a range of dates are a
+single slice of the file.  year_heatmap and heat_stripes accept a store in
+place of a DataFrame and read such slices without copying them, so every
+process drawing from the same store shares the operating system's page
+cache rather than holding a private copy of the data.
+
+The array has room for more days than are written, and grows by doubling
+when an append needs more, so days can be appended as they arrive.  One
+process should write to a store at a time; readers call `refresh()` to
+see the days written since they opened it.
+"""
+
+import json
+import os
+
+from .lazy_import import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+MAGIC = b'DAYSTORE1\n'
+HEADER_BYTES = 4096
+
+
+class DailyStore(object):
+    """
+    A column by day array on disk, opened with np.memmap.
+
+    Input:
+        path -- file made by DailyStore.create or ingest_daily
+        mode -- 'r' to read, 'r+' to also append
+    Example:
+        >>> store = ingest_daily('metrics.days', daily_aggregate(rows, 'sum'))
+        >>> fig, ax = year_heatmap(DailyStore('metrics.days'), year=2020)
+        >>> fig = heat_stripes(store, 'rain', mode='raster')
+    """
+    def __init__(self, path, mode='r'):
+        if mode not in ('r', 'r+'):
+            raise ValueError("mode must be 'r' or 'r+', not {!r}".format(mode))
+        self.path = path
+        self.mode = mode
+        self._open()
+
+    @classmethod
+    def create(cls, path, columns, start, dtype='float64', capacity=366):
+        """
+        Make a new, empty store, replacing any file at path
+        Input:
+            columns -- names of the columns
+            start -- date of the first day the store can hold.  A timezone
+                     aware date stores days of wall clock time in its zone
+            dtype -- a floating point dtype for the values.  float32 halves
+                     the size of the file
+            capacity -- days of room to allocate at first
+        Output:
+            the store, opened with mode 'r+'
+        """
+        dtype = np.dtype(dtype)
+        if dtype.kind != 'f':
+            raise ValueError('dtype must be a floating point type, not '
+                             '{}'.format(dtype))
+        start = pd.Timestamp(start)
+        header = {
+            'start': start.tz_localize(None).normalize().isoformat(),
+            'tz': None if start.tz is None else str(start.tz),
+            'columns': [str(c) for c in columns],
+            'dtype': dtype.str,
+            'days': 0,
+        }
+        _write_store(path, header, capacity)
+        return cls(path, 'r+')
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            self._header = _read_header(f)
+        self.columns = self._header['columns']
+        self.dtype = np.dtype(self._header['dtype'])
+        self.days = self._header['days']
+        self.start = pd.Timestamp(self._header['start'])
+        if self._header['tz'] is not None:
+            self.start = self.start.tz_localize(self._header['tz'])
+        self._data = np.memmap(self.path, dtype=self.dtype, mode=self.mode,
+                               offset=HEADER_BYTES,
+                               shape=(len(self.columns),
+                                      self._header['capacity']))
+
+    def __reduce__(self):
+        # Processes are handed the path and map the file themselves
+        return type(self), (self.path, self.mode)
+
+    def __len__(self):
+        return self.days
+
+    @property
+    def capacity(self):
+        return self._data.shape[1]
+
+    @property
+    def index(self):
+        """DatetimeIndex of the days written"""
+        return self._days(0, self.days)
+
+    def refresh(self):
+        """Pick up days appended to the file by another process"""
+        self._open()
+        return self
+
+    def array(self, columns=None, first=None, last=None):
+        """
+        Values of the columns for the days first to last, both included,
+        as read-only views of the file, one per column
+        """
+        start, stop = self._day_range(first, last)
+        rows = [self._column(c) for c in self._as_columns(columns)]
+        return [self._view(i, start, stop) for i in rows]
+
+    def frame(self, columns=None, first=None, last=None):
+        """
+        DataFrame of the columns, indexed by day, for the days first to
+        last (dates, both included).  Default is every column and day.
+        Each column is a view of the file, not a copy.
+        """
+        columns = self._as_columns(columns)
+        start, stop = self._day_range(first, last)
+        data = {c: self._view(self._column(c), start, stop) for c in columns}
+        return pd.DataFrame(data, index=self._days(start, stop),
+                            columns=columns, copy=False)
+
+    def series(self, column, first=None, last=None):
+        """One column as a Series viewing the file, see frame"""
+        start, stop = self._day_range(first, last)
+        return pd.Series(self._view(self._column(column), start, stop),
+                         index=self._days(start, stop), name=column,
+                         copy=False)
+
+    def append(self, by_day):
+        """
+        Write daily data into the store
+        Input:
+            by_day -- DataFrame with one row per day, indexed by date, such
+                      as daily_aggregate returns.  Its columns must be
+                      columns of the store; others are left missing for
+                      the new days.  Days already in the store are
+                      overwritten, so a day that gains rows must be
+                      appended whole again.  Days between the last one
+                      stored and the first new one are missing (NaN)
+        Output:
+            the store
+        """
+        if self.mode != 'r+':
+            raise ValueError("Open the store with mode 'r+' to append")
+        if not len(by_day):
+            return self
+        unknown = [c for c in by_day.columns if str(c) not in self.columns]
+        if unknown:
+            raise ValueError('Columns {} are not in the store'.format(unknown))
+        positions = self._positions(pd.DatetimeIndex(by_day.index))
+        if positions.min() < 0:
+            raise ValueError('Days before the store start {} cannot be '
+                             'appended'.format(self.start.date()))
+        needed = int(positions.max()) + 1
+        if needed > self.capacity:
+            self._grow(max(needed, 2 * self.capacity))
+
+        for col in by_day.columns:
+            self._data[self._column(str(col)), positions] = \
+                by_day[col].to_numpy(dtype=self.dtype)
+        self._data.flush()
+        # The day count is written after the data, so a reader never sees
+        # days that are not there yet
+        self.days = max(self.days, needed)
+        self._header['days'] = self.days
+        with open(self.path, 'r+b') as f:
+            f.write(_header_bytes(self._header))
+        return self
+
+    def _grow(self, capacity):
+        """Rewrite the store with room for `capacity` days"""
+        old = self._data
+        tmp = self.path + '.tmp'
+        _write_store(tmp, self._header, capacity,
+                     copy_from=old[:, :self.days])
+        os.replace(tmp, self.path)
+        del old
+        self._open()
+
+    def _as_columns(self, columns):
+        if columns is None:
+            return list(self.columns)
+        return [columns] if isinstance(columns, str) else list(columns)
+
+    def _column(self, column):
+        try:
+            return self.columns.index(column)
+        except ValueError:
+            raise KeyError(column) from None
+
+    def _view(self, row, start, stop):
+        view = np.asarray(self._data[row, start:stop])
+        view.flags.writeable = False
+        return view
+
+    def _positions(self, index):
+        """Day number of each timestamp, counting the start as day 0"""
+        days = index.tz_localize(None).values.astype('datetime64[D]')
+        return (days - np.datetime64(self.start.tz_localize(None).date(),
+                                     'D')).astype(np.int64)
+
+    def _day_range(self, first, last):
+        """Slice bounds of the days first to last, clipped to the store"""
+        start, stop = 0, self.days
+        if first is not None:
+            start = self._positions(pd.DatetimeIndex([first]))[0]
+        if last is not None:
+            stop = self._positions(pd.DatetimeIndex([last]))[0] + 1
+        start = int(min(max(start, 0), self.days))
+        return start, int(min(max(stop, start), self.days))
+
+    def _days(self, start, stop):
+        first = self.start.tz_localize(None) + pd.Timedelta(days=start)
+        return pd.date_range(first, periods=stop - start, freq='D',
+                             tz=self._header['tz'])
+
+
+def ingest_daily(path, by_day, start=None, dtype='float64', capacity=366):
+    """
+    Append daily data to the store at path, making it first if needed
+    Input:
+        by_day -- DataFrame of daily data, see DailyStore.append
+        start, dtype, capacity -- for a new store, see DailyStore.create.
+                                  Default start is the first day of by_day
+    Output:
+        the store, opened with mode 'r+'
+    """
+    if os.path.exists(path):
+        store = DailyStore(path, 'r+')
+    else:
+        store = DailyStore.create(
+            path, by_day.columns,
+            by_day.index[0] if start is None else start, dtype, capacity)
+    return store.append(by_day)
+
+
+def _header_bytes(header):
+    text = MAGIC + json.dumps(header).encode()
+    if len(text) > HEADER_BYTES:
+        raise ValueError('Too many or too long column names for the store '
+                         'header')
+    return text.ljust(HEADER_BYTES, b' ')
+
+
+def _read_header(f):
+    text = f.read(HEADER_BYTES)
+    if not text.startswith(MAGIC):
+        raise ValueError('{} is not a daily store'.format(f.name))
+    return json.loads(text[len(MAGIC):].decode())
+
+
+def _write_store(path, header, capacity, copy_from=None):
+    """Write a header and a NaN filled array of `capacity` days to path"""
+    header = dict(header, capacity=int(capacity))
+    with open(path, 'wb') as f:
+        f.write(_header_bytes(header))
+    data = np.memmap(path, dtype=np.dtype(header['dtype']), mode='r+',
+                     offset=HEADER_BYTES,
+                     shape=(len(header['columns']), header['capacity']))
+    data[:] = np.nan
+    if copy_from is not None:
+        data[:, :copy_from.shape[1]] = copy_from
+    data.flush()
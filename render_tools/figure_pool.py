@@ -0,0 +1,153 @@
+"""
+Pyplot-free rendering of the extensions to pixels or image bytes.
+
+The extensions in this collection take an optional `fig` and otherwise make
+their own Figure with an Agg canvas, so nothing is registered with pyplot's
+figure manager.  `FigurePool` keeps cleared figures for reuse between
+requests, and `render_rgba` / `render_png` run an extension on a pooled
+figure and return the result, which can be done from several threads at
+once since each call draws on its own figure.
+
+Example:
+    >>> pool = FigurePool()
+    >>> png = render_png(wedge_plot, df, pool=pool, figsize=(10, 10),
+    ...                  bbox_inches='tight')
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+import inspect
+import io
+import threading
+
+from .lazy_import import lazy_import
+
+mpl = lazy_import('matplotlib')
+backend_agg = lazy_import('matplotlib.backends.backend_agg')
+mfigure = lazy_import('matplotlib.figure')
+np = lazy_import('numpy')
+
+
+class FigurePool:
+    """
+    Thread-safe pool of idle Agg figures, keyed by size and dpi.
+
+    Input:
+        max_idle -- most idle figures kept for each size and dpi.  Figures
+                    released beyond this are dropped
+    """
+    def __init__(self, max_idle=4):
+        self.max_idle = max_idle
+        self._idle = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def acquire(self, figsize=None, dpi=100):
+        """
+        A cleared figure of figsize (inches) and dpi, reused if an idle one
+        has exactly that size.  figsize None is the matplotlib default size,
+        so the figure returned never depends on what the pool drew before.
+        """
+        if figsize is None:
+            figsize = mpl.rcParams['figure.figsize']
+        key = (tuple(float(x) for x in figsize), float(dpi))
+        with self._lock:
+            if self._idle[key]:
+                return self._idle[key].pop()
+
+        fig = mfigure.Figure(figsize=key[0], dpi=dpi)
+        backend_agg.FigureCanvasAgg(fig)
+        return fig
+
+    def release(self, fig):
+        """Clear a figure and keep it for reuse at its current size."""
+        fig.clear()
+        key = (tuple(float(x) for x in fig.get_size_inches()), float(fig.dpi))
+        with self._lock:
+            if len(self._idle[key]) < self.max_idle:
+                self._idle[key].append(fig)
+
+    @contextmanager
+    def figure(self, figsize=None, dpi=100):
+        """Context manager that acquires a figure and releases it on exit."""
+        fig = self.acquire(figsize, dpi)
+        try:
+            yield fig
+        finally:
+            self.release(fig)
+
+
+def render_rgba(extension, *args, pool=None, figsize=None, dpi=100,
+                profile=None, **kwargs):
+    """
+    Run a plot extension on a pooled figure and return the drawn image as
+    an (height, width, 4) uint8 RGBA array.
+
+    Input:
+        extension -- heat_stripes, wedge_plot, year_heatmap or any function
+                     accepting a `fig` keyword argument
+        args, kwargs -- arguments for the extension
+        pool -- FigurePool to take the figure from.  A figure is made for
+                this call alone if None
+        figsize, dpi -- size and resolution of the figure.  Default size
+                        is the extension's own figsize default, if it has
+                        one, or else the matplotlib default
+        profile -- a PhaseProfile, or any profile the extension accepts,
+                   which is given to the extension and also times the
+                   'draw' phase
+    """
+    if profile is not None:
+        kwargs['profile'] = profile
+    figsize = _extension_figsize(extension, figsize, kwargs)
+    pool = FigurePool(max_idle=0) if pool is None else pool
+    with pool.figure(figsize, dpi) as fig:
+        extension(*args, fig=fig, **kwargs)
+        with profile('draw') if profile is not None else nullcontext():
+            fig.canvas.draw()
+        return np.array(fig.canvas.buffer_rgba())
+
+
+def render_png(extension, *args, pool=None, figsize=None, dpi=100,
+               format='png', profile=None, **kwargs):
+    """
+    Run a plot extension on a pooled figure and return the saved image
+    as bytes.
+
+    Input:
+        extension, args, pool, figsize, dpi, profile -- as for render_rgba
+        format -- any format savefig supports, such as 'png' or 'svg'
+        kwargs -- arguments for the extension.  bbox_inches, pad_inches,
+                  facecolor and transparent are passed to savefig instead
+    """
+    savefig_kwargs = {k: kwargs.pop(k) for k in
+                      ('bbox_inches', 'pad_inches', 'facecolor', 'transparent')
+                      if k in kwargs}
+    if profile is not None:
+        kwargs['profile'] = profile
+    figsize = _extension_figsize(extension, figsize, kwargs)
+    pool = FigurePool(max_idle=0) if pool is None else pool
+    with pool.figure(figsize, dpi) as fig:
+        extension(*args, fig=fig, **kwargs)
+        buffer = io.BytesIO()
+        with profile('draw') if profile is not None else nullcontext():
+            fig.savefig(buffer, format=format, dpi=dpi, **savefig_kwargs)
+        return buffer.getvalue()
+
+
+def _extension_figsize(extension, figsize, kwargs):
+    """
+    Size of the figure to render extension on: figsize if given, else the
+    default of the extension's own figsize argument, if it has one.  An
+    extension taking figsize is passed it in kwargs too, so it lays the
+    plot out for the figure it is given.
+    """
+    try:
+        parameter = inspect.signature(extension).parameters.get('figsize')
+    except (TypeError, ValueError):
+        parameter = None
+    if parameter is None:
+        return figsize
+    if figsize is None and parameter.default is not parameter.empty:
+        figsize = parameter.default
+    if figsize is not None:
+        kwargs['figsize'] = figsize
+    return figsize
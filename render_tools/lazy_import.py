@@ -0,0 +1,32 @@
+"""
+Deferred imports of heavy dependencies.
+
+numpy, pandas and matplotlib take far longer to import than the
+extensions and these tools, so their modules hold stand ins made by
+lazy_import, which import the real module the first time one of its
+attributes is used.  Loading an extension through pandex is then cheap,
+and the import cost is paid by the first call that needs it.
+"""
+
+import importlib
+
+
+class LazyModule(object):
+    """Stand in for a module that is imported on first attribute access."""
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return '<lazy module {!r} ({})>'.format(self._name, state)
+
+
+def lazy_import(name):
+    """A LazyModule for the module called name, such as 'numpy'."""
+    return LazyModule(name)
@@ -0,0 +1,84 @@
+"""
+Per-phase timings from inside the plot extensions.
+
+heat_stripes, wedge_plot and year_heatmap take a `profile` argument.  It
+is called with the name of each phase of the plot, such as 'aggregate',
+'grid', 'artists', 'labels', 'legend' or 'layout', and the returned
+context manager is wrapped around that phase.  When it is None the
+extensions use a shared no-op context, so leaving the argument in place
+costs nothing.  `PhaseProfile` is a ready made profile that records the
+time of each phase, and optionally the memory allocated in it, and can
+pass every record on to a callback, such as a logger, as it is made.
+render_png and render_rgba time the final 'draw' phase with it too.
+
+Example:
+    >>> profile = PhaseProfile(allocations=True)
+    >>> png = render_png(year_heatmap, df, profile=profile)
+    >>> profile.totals()
+    {'aggregate': 0.41, 'grid': 0.02, 'figure': 0.15, 'artists': 0.38,
+     'layout': 1.20, 'draw': 2.05}
+"""
+
+from collections import namedtuple
+from contextlib import contextmanager
+import time
+import tracemalloc
+
+Phase = namedtuple('Phase', [
+    'name',       # phase name, such as 'artists'
+    'seconds',    # wall time spent in the phase
+    'allocated',  # net bytes allocated, None unless allocations are traced
+    'peak',       # peak bytes allocated above the start of the phase
+])
+
+
+class PhaseProfile:
+    """
+    Records the phases run by an extension.
+
+    Input:
+        callback -- optional function called with each Phase as it ends
+        allocations -- if True, memory allocated through Python and numpy
+                       is traced with tracemalloc during each phase.  This
+                       slows the phases down noticeably
+    """
+    def __init__(self, callback=None, allocations=False):
+        self.callback = callback
+        self.allocations = allocations
+        self.phases = []
+
+    @contextmanager
+    def __call__(self, name):
+        started_tracing = False
+        if self.allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            allocated = peak = None
+            if self.allocations:
+                current, peak = tracemalloc.get_traced_memory()
+                allocated, peak = current - base, peak - base
+                if started_tracing:
+                    tracemalloc.stop()
+            phase = Phase(name, seconds, allocated, peak)
+            self.phases.append(phase)
+            if self.callback is not None:
+                self.callback(phase)
+
+    def totals(self):
+        """Seconds spent in each phase, summed over repeated phases."""
+        totals = {}
+        for phase in self.phases:
+            totals[phase.name] = totals.get(phase.name, 0) + phase.seconds
+        return totals
+
+    def clear(self):
+        """Forget the recorded phases, to reuse the profile."""
+        self.phases = []
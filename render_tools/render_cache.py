@@ -0,0 +1,356 @@
+"""
+Content addressed on-disk cache of rendered extension images.
+
+A report that asks for the same year_heatmap, wedge_plot or heat_stripes
+image with the same data and parameters gets the stored PNG or SVG bytes
+back instead of drawing it again.  The key of an image is a hash of:
+
+- the extension's qualified name and the matplotlib version;
+- the data the extension reads.  Only the columns named by its column
+  arguments (value_cols, ring_values, col, ...) and the index are hashed,
+  with `pd.util.hash_pandas_object`, so no rows are iterated in Python.
+  A DailyStore is hashed by its header and the days of those columns it
+  holds now, so appending to it changes the key;
+- every other argument, normalised so that equal values give equal keys.
+  Functions such as wedge_label_format and legend_tickvalues, lambdas
+  included, are keyed by their qualified name together with their
+  bytecode, constants, defaults and closure, so two functions under one
+  name get different keys.  The globals a function reads are not part
+  of its key, so changing one needs a new `salt`.
+
+Each image is one file named by its key.  Files are written to a
+temporary name and renamed into place, so several processes can share a
+cache directory and never read a partial image.  A hit touches the
+file's modification time, and when the directory grows past `max_bytes`
+the least recently used files are removed.
+
+Example:
+    >>> cache = RenderCache('/var/cache/report_images', max_bytes=2 ** 30)
+    >>> png = cache.render(wedge_plot, df, figsize=(10, 10),
+    ...                    wedge_label_format=percent, bbox_inches='tight')
+    >>> cache.stats()
+    CacheStats(hits=0, misses=1, evictions=0, entries=1, nbytes=48213, ...)
+"""
+
+from collections import namedtuple
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+import threading
+
+from .lazy_import import lazy_import
+
+matplotlib = lazy_import('matplotlib')
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+CacheStats = namedtuple('CacheStats', [
+    'hits',       # images returned from the cache by this object
+    'misses',     # images rendered and stored by this object
+    'evictions',  # files removed by this object to stay under max_bytes
+    'entries',    # images in the cache directory
+    'nbytes',     # bytes of images in the cache directory
+    'max_bytes',  # size limit of the cache directory
+])
+
+# The argument naming the columns each extension reads, and any further
+# column arguments.  If the first is None the extension reads every column
+COLUMN_ARGUMENTS = {
+    'year_heatmap': ('value_cols', 'time_col'),
+    'heat_stripes': ('col', 'index'),
+    'wedge_plot': ('ring_values', 'slice_labels'),
+    'stripe_matrix': ('cols', 'by', 'value', 'index'),
+}
+
+# Arguments render_png uses itself, with its defaults
+RENDER_OPTIONS = {'figsize': None, 'dpi': 100, 'format': 'png',
+                  'bbox_inches': None, 'pad_inches': None, 'facecolor': None,
+                  'transparent': None}
+
+# Arguments that do not change the image
+_UNKEYED = ('pool', 'profile', 'fig', 'ax', 'cache')
+
+
+class RenderCache:
+    """
+    Cache of rendered images in a directory shared by any number of
+    threads and processes.
+
+    Input:
+        directory -- where images are stored.  It is made if needed
+        max_bytes -- size the directory is kept under by removing the least
+                     recently used images
+        salt -- any string mixed into every key, such as a release number,
+                to start afresh when the extensions change
+    """
+    def __init__(self, directory, max_bytes=512 * 2 ** 20, salt=''):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.salt = salt
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._hits = self._misses = self._evictions = 0
+        # Our estimate of the directory size, corrected by each full scan
+        self._nbytes = sum(size for _, size, _ in self._scan())
+
+    def key(self, extension, *args, **kwargs):
+        """
+        Hex digest identifying the image an extension call would make, with
+        arguments as for render
+        """
+        options = {k: kwargs.pop(k, default)
+                   for k, default in RENDER_OPTIONS.items()}
+        for name in _UNKEYED:
+            kwargs.pop(name, None)
+        arguments = _arguments(extension, args, kwargs)
+        for name in _UNKEYED:
+            arguments.pop(name, None)
+
+        columns = _columns_read(_name(extension), arguments)
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(repr((self.salt, _name(extension),
+                            matplotlib.__version__,
+                            _normalise(options))).encode())
+        for name in sorted(arguments):
+            digest.update(repr(name).encode())
+            digest.update(_hash_value(arguments[name], columns))
+        return digest.hexdigest()
+
+    def get(self, key, format='png'):
+        """Stored bytes for a key, or None"""
+        path = self._path(key, format)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            # Not stored, or removed by another process meanwhile
+            return None
+        return data
+
+    def put(self, key, data, format='png'):
+        """Store bytes for a key, atomically, and evict if over the limit"""
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self._path(key, format))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        with self._lock:
+            self._nbytes += len(data)
+            over = self._nbytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def render(self, extension, *args, format='png', **kwargs):
+        """
+        Image bytes of an extension call, from the cache or rendered with
+        render_png and stored.  Arguments are as for render_png.
+        """
+        key = self.key(extension, *args, format=format, **kwargs)
+        data = self.get(key, format)
+        with self._lock:
+            if data is not None:
+                self._hits += 1
+            else:
+                self._misses += 1
+        if data is None:
+            from .figure_pool import render_png
+            data = render_png(extension, *args, format=format, **kwargs)
+            self.put(key, data, format)
+        return data
+
+    def evict(self):
+        """Remove least recently used images until under max_bytes"""
+        files = sorted(self._scan(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for path, size, _ in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._lock:
+            self._nbytes = total
+            self._evictions += removed
+
+    def stats(self):
+        """Hit and miss counts of this object and the size of the cache"""
+        files = list(self._scan())
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions,
+                              len(files), sum(size for _, size, _ in files),
+                              self.max_bytes)
+
+    def clear(self):
+        """Remove every stored image and reset the counts"""
+        for path, _, _ in self._scan():
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._nbytes = 0
+            self._hits = self._misses = self._evictions = 0
+
+    def _path(self, key, format):
+        return os.path.join(self.directory, '{}.{}'.format(key, format))
+
+    def _scan(self):
+        """(path, size, mtime) of every stored image"""
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith('.tmp') or not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield entry.path, stat.st_size, stat.st_mtime
+
+
+def _name(obj):
+    """Qualified name of a function or class"""
+    module = getattr(obj, '__module__', None)
+    qualname = getattr(obj, '__qualname__', None) or type(obj).__qualname__
+    return qualname if module is None else '{}.{}'.format(module, qualname)
+
+
+def _arguments(extension, args, kwargs):
+    """
+    Arguments of a call by parameter name, defaults included and those
+    gathered by **kwargs spread out
+    """
+    try:
+        signature = inspect.signature(extension)
+        bound = signature.bind_partial(*args, **kwargs)
+    except (TypeError, ValueError):
+        return dict(kwargs, **{'*{}'.format(i): a for i, a in enumerate(args)})
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    for name, param in signature.parameters.items():
+        if param.kind == param.VAR_KEYWORD:
+            arguments.update(arguments.pop(name))
+        elif param.kind == param.VAR_POSITIONAL:
+            arguments[name] = tuple(arguments[name])
+    return arguments
+
+
+def _columns_read(name, arguments):
+    """Columns of the data an extension reads, or None for all of them"""
+    column_args = COLUMN_ARGUMENTS.get(name.rsplit('.', 1)[-1])
+    if column_args is None or arguments.get(column_args[0]) is None:
+        return None
+    columns = []
+    for arg in column_args:
+        value = arguments.get(arg)
+        if value is None:
+            continue
+        columns.extend([value] if isinstance(value, str) else value)
+    return columns
+
+
+def _hash_value(value, columns=None):
+    """Bytes that are equal for equal argument values"""
+    if callable(getattr(type(value), 'frame', None)):
+        # A DailyStore: its header and the days of the columns read now
+        if columns is not None:
+            columns = [c for c in dict.fromkeys(columns)
+                       if c in value.columns]
+        header = (list(value.columns), value.days, str(value.start),
+                  str(value.dtype))
+        return _digest(repr(('store', header)).encode(),
+                       _hash_value(value.frame(columns)))
+    if isinstance(value, pd.DataFrame):
+        if columns is not None:
+            value = value[[c for c in dict.fromkeys(columns)
+                           if c in value.columns]]
+        rows = pd.util.hash_pandas_object(value, index=True).to_numpy()
+        return _digest(repr((list(value.columns), [str(d) for d in
+                                                   value.dtypes])).encode(),
+                       rows.tobytes())
+    if isinstance(value, (pd.Series, pd.Index)):
+        rows = pd.util.hash_pandas_object(value).to_numpy()
+        return _digest(repr((value.name, str(value.dtype))).encode(),
+                       rows.tobytes())
+    if isinstance(value, np.ndarray):
+        return _digest(repr((value.shape, str(value.dtype))).encode(),
+                       np.ascontiguousarray(value).tobytes())
+    return repr(_normalise(value)).encode()
+
+
+def _normalise(value):
+    """A repr-able form of an argument, with functions by name"""
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return ('dict', sorted((repr(k), _normalise(v))
+                               for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__, [_normalise(v) for v in value])
+    if isinstance(value, (set, frozenset)):
+        return ('set', sorted(repr(_normalise(v)) for v in value))
+    if (isinstance(value, (pd.DataFrame, pd.Series, pd.Index, np.ndarray))
+            or callable(getattr(type(value), 'frame', None))):
+        return _hash_value(value).hex()
+    if inspect.isroutine(value) or inspect.isclass(value):
+        return ('callable', _name(value), _function_key(value))
+    try:
+        return ('pickle', hashlib.blake2b(pickle.dumps(value, protocol=4),
+                                          digest_size=20).hexdigest())
+    except (pickle.PicklingError, TypeError, AttributeError):
+        raise TypeError('Cannot make a cache key from {!r}'.format(value))
+
+
+def _function_key(function):
+    """
+    Hex digest of what a Python function does: its code, defaults and
+    closure, and the object a method is bound to.  None for builtins and
+    classes, which are keyed by name.
+    """
+    code = getattr(function, '__code__', None)
+    if code is None:
+        return None
+    cells = []
+    for cell in getattr(function, '__closure__', None) or ():
+        try:
+            contents = cell.cell_contents
+        except ValueError:
+            # A cell not filled yet
+            cells.append(('empty cell',))
+            continue
+        # A nested function that calls itself holds itself in its closure
+        cells.append(('self',) if contents is function
+                     else _normalise(contents))
+    bound_to = getattr(function, '__self__', None)
+    return hashlib.blake2b(repr((
+        _code_key(code),
+        _normalise(getattr(function, '__defaults__', None)),
+        _normalise(getattr(function, '__kwdefaults__', None)),
+        cells,
+        None if inspect.ismodule(bound_to) else _normalise(bound_to),
+    )).encode(), digest_size=20).hexdigest()
+
+
+def _code_key(code):
+    """A repr-able form of a code object and the code objects it holds"""
+    consts = [_code_key(c) if inspect.iscode(c) else _normalise(c)
+              for c in code.co_consts]
+    return (code.co_code.hex(), code.co_names, code.co_varnames, consts)
+
+
+def _digest(*parts):
+    digest = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        digest.update(part)
+    return digest.digest()
@@ -0,0 +1,221 @@
+"""
+One pass scale statistics for colour limits.
+
+`ScaleStats` keeps a running count, mean, variance, min and max of every
+column, and optionally a bounded size quantile sketch, and is fed a whole
+frame or a frame at a time, so colour limits, including robust percentile
+limits such as the 2nd to 98th, can be found for data that is too large
+to hold or sort.
+
+The sketch is a compactor hierarchy in the style of KLL: values enter
+level 0, and a level holding more than `sketch_size` values is sorted and
+every other value, from a random start, moves up a level with twice the
+weight.  Memory stays at about `sketch_size` values per level, for a
+logarithmic number of levels, and the rank error of a quantile is a small
+multiple of 1 / sketch_size.
+"""
+
+from .lazy_import import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+class QuantileSketch(object):
+    """
+    Bounded memory approximate quantiles of a stream of numbers.
+
+    Input:
+        k -- most values kept on each level of the sketch
+        seed -- seed of the random compaction offsets, for repeatable
+                results
+    """
+    def __init__(self, k=1024, seed=0):
+        self.k = k
+        self._levels = []
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, values):
+        """Add an array of values, NaNs are ignored.  Returns self."""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        level = 0
+        if len(values) > self.k:
+            # Compact a large array straight to the level where it fits
+            values = np.sort(values)
+            level = int(np.ceil(np.log2(len(values) / self.k)))
+            step = 2 ** level
+            values = values[self._rng.integers(step)::step]
+        self._insert(values, level)
+        return self
+
+    def _insert(self, values, level):
+        while True:
+            while len(self._levels) <= level:
+                self._levels.append(np.empty(0))
+            merged = np.concatenate([self._levels[level], values])
+            if len(merged) <= self.k:
+                self._levels[level] = merged
+                return
+            merged.sort()
+            self._levels[level] = np.empty(0)
+            values = merged[self._rng.integers(2)::2]
+            level += 1
+
+    def quantile(self, q):
+        """
+        Approximate quantile(s) q, between 0 and 1, of the values added,
+        or NaN if none were
+        """
+        values = np.concatenate(self._levels) if self._levels else np.empty(0)
+        if not len(values):
+            return np.full(np.shape(q), np.nan)[()]
+        weights = np.concatenate([np.full(len(v), 2.0 ** h)
+                                  for h, v in enumerate(self._levels)])
+        order = np.argsort(values, kind='stable')
+        values, weights = values[order], weights[order]
+        # Each value stands at the middle of the ranks it represents
+        ranks = (np.cumsum(weights) - weights / 2) / weights.sum()
+        return np.interp(q, ranks, values)
+
+
+class ScaleStats(object):
+    """
+    Per column count, mean, standard deviation, min, max and approximate
+    quantiles, gathered in one pass over a frame or over chunks of it.
+
+    Input:
+        sketch_size -- values kept per level of each column's quantile
+                       sketch.  None skips the sketches, which makes add()
+                       cheaper when no percentiles are needed
+        seed -- seed for the sketches
+    Example:
+        >>> stats = ScaleStats()
+        >>> for chunk in pd.read_csv(path, chunksize=10 ** 6):
+        ...     stats.add(chunk[['temperature', 'rain']])
+        >>> stats.limits('rain', clip=(2, 98))
+    """
+    def __init__(self, sketch_size=1024, seed=0):
+        self.sketch_size = sketch_size
+        self.seed = seed
+        self.columns = None
+        self._positions = None
+        self._count = self._mean = self._m2 = self._min = self._max = None
+        self._sketches = None
+
+    def add(self, data):
+        """
+        Fold a DataFrame, Series or 2D array (rows by columns) into the
+        statistics.  Every chunk must have the same columns.  Returns self.
+        """
+        if isinstance(data, pd.Series):
+            data = data.to_frame()
+        if isinstance(data, pd.DataFrame):
+            columns = list(data.columns)
+            values = data.to_numpy(dtype=float)
+        else:
+            values = np.asarray(data, dtype=float)
+            if values.ndim == 1:
+                values = values[:, np.newaxis]
+            columns = list(range(values.shape[1]))
+        if self.columns is None:
+            self._start(columns)
+        elif columns != self.columns:
+            raise ValueError('Chunk columns {} do not match {}'
+                             .format(columns, self.columns))
+
+        count = np.sum(~np.isnan(values), axis=0)
+        present = count > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(present, np.nansum(values, axis=0) / count, 0.0)
+            m2 = np.nansum((values - mean) ** 2, axis=0)
+            # Chan et al.'s update of the running mean and sum of squares
+            total = self._count + count
+            delta = mean - self._mean
+            self._mean = np.where(present,
+                                  self._mean + delta * count / total,
+                                  self._mean)
+            self._m2 = np.where(present,
+                                self._m2 + m2
+                                + delta ** 2 * self._count * count / total,
+                                self._m2)
+        self._count = total
+        if present.any():
+            low = np.full(len(present), np.nan)
+            high = np.full(len(present), np.nan)
+            low[present] = np.nanmin(values[:, present], axis=0)
+            high[present] = np.nanmax(values[:, present], axis=0)
+            self._min = np.fmin(self._min, low)
+            self._max = np.fmax(self._max, high)
+        if self._sketches is not None:
+            for sketch, column in zip(self._sketches, values.T):
+                sketch.add(column)
+        return self
+
+    def _start(self, columns):
+        self.columns = columns
+        # Position of each column, so looking one up does not scan them all
+        self._positions = {c: i for i, c in enumerate(columns)}
+        n = len(columns)
+        self._count = np.zeros(n, dtype=np.int64)
+        self._mean = np.zeros(n)
+        self._m2 = np.zeros(n)
+        self._min = np.full(n, np.nan)
+        self._max = np.full(n, np.nan)
+        if self.sketch_size is not None:
+            self._sketches = [QuantileSketch(self.sketch_size, self.seed + i)
+                              for i in range(n)]
+
+    def _column(self, column):
+        if self.columns is None:
+            raise ValueError('No data has been added')
+        return 0 if column is None else self._positions[column]
+
+    def count(self, column=None):
+        return int(self._count[self._column(column)])
+
+    def mean(self, column=None):
+        i = self._column(column)
+        return float(self._mean[i]) if self._count[i] else np.nan
+
+    def std(self, column=None, ddof=1):
+        """Standard deviation, with ddof=1 as in pandas by default"""
+        i = self._column(column)
+        if self._count[i] <= ddof:
+            return np.nan
+        return float(np.sqrt(self._m2[i] / (self._count[i] - ddof)))
+
+    def min(self, column=None):
+        return float(self._min[self._column(column)])
+
+    def max(self, column=None):
+        return float(self._max[self._column(column)])
+
+    def quantile(self, q, column=None):
+        """Approximate quantile(s) q, between 0 and 1, of a column"""
+        if self._sketches is None:
+            raise ValueError('Quantiles need ScaleStats(sketch_size=...) '
+                             'to be set')
+        return self._sketches[self._column(column)].quantile(q)
+
+    def limits(self, column=None, clip=None):
+        """
+        (low, high) colour limits of a column: its min and max, or with
+        clip=(2, 98) its approximate 2nd and 98th percentiles
+        """
+        if clip is None:
+            return self.min(column), self.max(column)
+        low, high = self.quantile(np.asarray(clip) / 100, column)
+        return float(low), float(high)
+
+    def summary(self):
+        """DataFrame of count, mean, std, min and max, one row per column"""
+        return pd.DataFrame({
+            'count': [self.count(c) for c in self.columns],
+            'mean': [self.mean(c) for c in self.columns],
+            'std': [self.std(c) for c in self.columns],
+            'min': [self.min(c) for c in self.columns],
+            'max': [self.max(c) for c in self.columns],
+        }, index=self.columns)
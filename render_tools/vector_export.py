@@ -0,0 +1,81 @@
+"""
+Compact SVG/PDF export for figures made by the extensions.
+
+A multi-year year_heatmap or a long heat_stripes holds thousands of day
+cells or stripes, and each one becomes its own path in vector output.
+`export_compact` rasterizes just those dense meshes and collections at a
+chosen dpi while titles, tick labels, wedge labels and the centre text
+stay as vectors, and reports the file size and write time so that the
+tradeoff can be chosen per report.
+
+Each axes holding rasterized artists costs one raster pass over the whole
+figure, so year_heatmap(..., layout='single'), which has one axes, exports
+far faster than the subplots layout, which has one per calendar.
+
+Example:
+    >>> for dpi in (None, 300, 150):
+    ...     print(export_compact(fig, 'calendar.pdf', dpi=dpi))
+"""
+
+import os
+import time
+
+from .lazy_import import lazy_import
+
+mcollections = lazy_import('matplotlib.collections')
+mimage = lazy_import('matplotlib.image')
+
+
+def export_compact(fig, path, dpi=150, min_elements=100, format=None,
+                   **savefig_kwargs):
+    """
+    Save a figure with its dense collections rasterized.
+
+    Input:
+        fig -- a matplotlib Figure
+        path -- file to write.  The format follows the extension unless
+                format is given
+        dpi -- resolution of the rasterized parts.  If None nothing is
+               rasterized, which gives the plain vector file to compare with
+        min_elements -- collections (QuadMesh, PatchCollection,
+                        PolyCollection, ...) with at least this many paths
+                        or cells are rasterized.  Images always are
+        format -- output format, such as 'svg' or 'pdf'
+        savefig_kwargs -- passed on to savefig
+    Output:
+        dict of the 'path', the file size in 'bytes', the write time in
+        'seconds' and the number of 'rasterized' artists
+    """
+    dense = []
+    if dpi is not None:
+        for ax in fig.axes:
+            for artist in ax.get_children():
+                if isinstance(artist, mimage.AxesImage) or (
+                        isinstance(artist, mcollections.Collection)
+                        and _num_elements(artist) >= min_elements):
+                    dense.append((artist, artist.get_rasterized()))
+                    artist.set_rasterized(True)
+        savefig_kwargs['dpi'] = dpi
+
+    start = time.perf_counter()
+    try:
+        fig.savefig(path, format=format, **savefig_kwargs)
+    finally:
+        for artist, rasterized in dense:
+            artist.set_rasterized(rasterized)
+    seconds = time.perf_counter() - start
+
+    return {
+        'path': path,
+        'bytes': os.path.getsize(path),
+        'seconds': seconds,
+        'rasterized': len(dense),
+    }
+
+
+def _num_elements(collection):
+    """Number of paths in a collection, or cells in a mesh"""
+    array = collection.get_array()
+    if array is not None:
+        return array.size
+    return len(collection.get_paths())
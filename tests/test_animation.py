@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+import pytest
+from matplotlib import animation
+
+from matplotblog.stripes_animation import animate_stripes
+from render_tools.animation import PNGSequenceWriter, save_animation
+
+
+def _anim():
+    df = pd.DataFrame({'t': np.random.default_rng(0).random(60)},
+                      index=range(1950, 2010))
+    return animate_stripes(df, 't', step=20)
+
+
+def test_png_sequence(tmp_path):
+    save_animation(_anim(), str(tmp_path / 'f{:03d}.png'))
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        'f000.png', 'f001.png', 'f002.png']
+    assert issubclass(PNGSequenceWriter, animation.AbstractMovieWriter)
+
+
+def test_no_writer_available(tmp_path, monkeypatch):
+    monkeypatch.setattr(animation.writers, 'is_available', lambda name: False)
+    with pytest.raises(ValueError, match='No animation writer'):
+        save_animation(_anim(), str(tmp_path / 'a.gif'))
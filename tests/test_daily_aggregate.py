@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from year_heatmap.daily_aggregate import DailyAccumulator, daily_aggregate
+
+METHODS = ['sum', 'count', 'mean', 'min', 'max']
+
+
+def _rows(tz=None, rows=5000, seed=0):
+    """Unsorted timestamps over two months, with gaps and missing values"""
+    rng = np.random.default_rng(seed)
+    seconds = rng.integers(0, 60 * 86400, rows)
+    seconds = seconds[(seconds // 86400) % 9 != 4]
+    index = (pd.Timestamp('2020-03-01', tz=tz)
+             + pd.to_timedelta(seconds, unit='s'))
+    values = rng.normal(size=(len(index), 2))
+    values[::11, 1] = np.nan
+    return pd.DataFrame(values, index=index, columns=['a', 'b'])
+
+
+def _resampled(df, how):
+    return df.sort_index().resample('D').agg(how)
+
+
+@pytest.mark.parametrize('tz', [None, 'America/New_York'])
+@pytest.mark.parametrize('how', METHODS)
+def test_daily_aggregate_matches_resample(how, tz):
+    df = _rows(tz)
+    pd.testing.assert_frame_equal(daily_aggregate(df, how),
+                                  _resampled(df, how), check_freq=False,
+                                  check_dtype=False)
+
+
+def test_daily_aggregate_by_column():
+    df = _rows()
+    how = {'a': 'max', 'b': 'count'}
+    pd.testing.assert_frame_equal(daily_aggregate(df, how),
+                                  _resampled(df, how), check_freq=False,
+                                  check_dtype=False)
+
+
+@pytest.mark.parametrize('tz', [None, 'Europe/London'])
+@pytest.mark.parametrize('how', METHODS)
+def test_accumulator_matches_resample(how, tz):
+    df = _rows(tz)
+    days = DailyAccumulator(how)
+    # Chunks out of time order, overlapping in time
+    shuffled = df.sample(frac=1, random_state=0)
+    for start in range(0, len(shuffled), 1500):
+        days.add(shuffled.iloc[start:start + 1500])
+    pd.testing.assert_frame_equal(days.result(), _resampled(df, how),
+                                  check_freq=False, check_dtype=False)
+
+
+def test_accumulator_rejects_callables():
+    with pytest.raises(ValueError):
+        DailyAccumulator(np.median).add(_rows())
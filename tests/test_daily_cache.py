@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from year_heatmap.daily_aggregate import daily_aggregate
+from year_heatmap.daily_cache import DailyCache
+
+
+def _frame(rows=10000, tz=None):
+    rng = np.random.default_rng(0)
+    index = pd.date_range('2019-01-01', periods=rows, freq='h', tz=tz)
+    return pd.DataFrame({'a': rng.random(rows),
+                         'b': rng.integers(0, 10, rows)}, index=index)
+
+
+def test_appended_rows_are_folded_in():
+    df = _frame()
+    cache = DailyCache()
+    cache.daily(df.iloc[:6000], 'sum')
+    daily = cache.daily(df, 'sum')
+    pd.testing.assert_frame_equal(daily, daily_aggregate(df, 'sum'),
+                                  check_freq=False, check_dtype=False)
+    assert cache.info()[:3] == (0, 1, 1)
+
+
+def test_rows_edited_in_place_are_not_served_stale():
+    df = _frame(tz='Europe/London')
+    cache = DailyCache()
+    cache.daily(df, 'sum')
+    df.iloc[4321, 0] += 100
+    daily = cache.daily(df, 'sum')
+    pd.testing.assert_frame_equal(daily, daily_aggregate(df, 'sum'),
+                                  check_freq=False, check_dtype=False)
+    assert cache.info()[:3] == (0, 0, 2)
+
+
+def test_text_columns_are_compared_by_value():
+    df = _frame().assign(c='x')
+    cache = DailyCache()
+    cache.daily(df, None)
+    cache.daily(df.copy(), None)
+    df.iloc[5000, 2] = 'y'
+    cache.daily(df, None)
+    assert cache.info()[:3] == (1, 0, 2)
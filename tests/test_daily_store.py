@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from matplotblog.warm_stripes import heat_stripes
+from render_tools.daily_store import DailyStore, ingest_daily
+from year_heatmap.year_heatmap import year_heatmap
+
+
+def test_one_store_is_read_by_both_extensions(tmp_path):
+    days = pd.date_range('2019-01-01', '2020-12-31', freq='D')
+    by_day = pd.DataFrame({'rain': np.random.default_rng(0).random(len(days))},
+                          index=days)
+    path = str(tmp_path / 'rain.days')
+    ingest_daily(path, by_day)
+    store = DailyStore(path)
+
+    fig, ax = year_heatmap(store, year=2020)
+    assert len(fig.axes) == 1
+    fig = heat_stripes(store, 'rain', mode='raster', first='2020-01-01')
+    assert fig.axes[0].images
+
+
+def test_a_store_is_drawn_as_a_raster_by_default(tmp_path):
+    days = pd.date_range('2019-01-01', periods=100, freq='D')
+    path = str(tmp_path / 'rain.days')
+    ingest_daily(path, pd.DataFrame({'rain': np.arange(100.0)}, index=days))
+
+    fig = heat_stripes(DailyStore(path), 'rain')
+    assert fig.axes[0].images
+    assert not fig.axes[0].collections
@@ -0,0 +1,37 @@
+import io
+
+import matplotlib as mpl
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from matplotblog.warm_stripes import heat_stripes
+from render_tools.figure_pool import FigurePool, render_png
+from year_heatmap.year_heatmap import year_heatmap
+
+
+def _size(png):
+    return Image.open(io.BytesIO(png)).size
+
+
+def test_render_size_does_not_depend_on_pool_history():
+    days = pd.date_range('2019-01-01', '2019-12-31', freq='D')
+    df = pd.DataFrame({'a': np.random.default_rng(0).random(len(days))},
+                      index=days)
+    pool = FigurePool()
+
+    render_png(year_heatmap, df, pool=pool)
+    # heat_stripes keeps its own 10 x 1 inch default
+    assert _size(render_png(heat_stripes, df, 'a', mode='raster',
+                            pool=pool)) == (1000, 100)
+    assert _size(render_png(heat_stripes, df, 'a', mode='raster',
+                            pool=pool, figsize=(5, 2))) == (500, 200)
+
+
+def test_acquire_without_figsize_is_the_default_size():
+    pool = FigurePool()
+    fig = pool.acquire((15, 5))
+    pool.release(fig)
+    fig = pool.acquire()
+    assert (tuple(fig.get_size_inches())
+            == tuple(mpl.rcParams['figure.figsize']))
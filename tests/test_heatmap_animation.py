@@ -0,0 +1,18 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from year_heatmap.heatmap_animation import animate_year_heatmap
+
+
+def test_days_of_late_years_fill_in_order():
+    days = pd.date_range('2059-01-01', '2060-12-31', freq='D')
+    df = pd.DataFrame({'a': np.arange(len(days), dtype=float)}, index=days)
+    anim = animate_year_heatmap(df, how=None, step=30)
+
+    day = (datetime.date(2060, 7, 1) - datetime.date(1970, 1, 1)).days
+    meshes = anim._func(day)
+    shown = [int(np.ma.count(mesh.get_array())) for mesh in meshes]
+    # All of 2059, and 2060 up to and including the 1st of July
+    assert shown == [365, 183]
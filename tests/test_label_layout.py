@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from wedge_plot.label_layout import cap_labels
+from wedge_plot.wedge_plot import wedge_plot
+
+
+def _wedge_frame(slices, rings):
+    """Frame of slices by rings and the wedge_plot arguments to draw it"""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.integers(0, 100, size=(slices, rings)),
+                      index=['slice {}'.format(i) for i in range(slices)],
+                      columns=['ring {}'.format(i) for i in range(rings)])
+    width = 0.8 / rings
+    kwargs = {'colours': ['Purples', 'Greens', 'OrRd'][:rings],
+              'radius': [0.3 + width * (i + 1) for i in range(rings)],
+              'wedge_width': [width] * rings}
+    return df, kwargs
+
+
+def _groups():
+    return [np.arange(10), np.arange(0), np.arange(7), np.arange(3)]
+
+
+def test_cap_labels_thins_every_group_by_the_same_stride():
+    capped = cap_labels(_groups(), 8)
+    assert [list(g) for g in capped] == [[0, 3, 6, 9], [], [0, 3, 6], [0]]
+
+
+@pytest.mark.parametrize('max_labels', [0, 1, 2])
+def test_cap_labels_below_the_number_of_groups(max_labels):
+    capped = cap_labels(_groups(), max_labels)
+    assert sum(len(g) for g in capped) == max_labels
+    assert all(len(g) <= 1 for g in capped)
+
+
+def test_cap_labels_rejects_a_negative_cap():
+    with pytest.raises(ValueError):
+        cap_labels(_groups(), -1)
+
+
+@pytest.mark.parametrize('max_labels', [0, 3])
+def test_wedge_plot_with_fewer_labels_than_groups(max_labels):
+    # 3 rings and the slice labels make 4 groups of labels
+    df, kwargs = _wedge_frame(12, 3)
+    handle = wedge_plot(df, max_labels=max_labels, return_handle=True,
+                        **kwargs)
+    assert handle.label_layout.drawn == max_labels
@@ -0,0 +1,48 @@
+from concurrent import futures
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from demo.circle_calcs import circle_calculations
+from demo.geometry_kernels import OUTPUTS, geometry_kernel
+from demo.parallel_kernels import parallel_geometry_kernel
+
+
+def _radius(rows=10001):
+    return np.random.default_rng(0).random(rows) * 10
+
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_chunks_match_the_serial_kernel(executor):
+    r = _radius()
+    results = parallel_geometry_kernel(r, executor=executor, workers=3,
+                                       min_rows=0)
+    expected = geometry_kernel(r)
+    assert sorted(results) == sorted(OUTPUTS)
+    for name in OUTPUTS:
+        np.testing.assert_array_equal(results[name], expected[name])
+
+
+def test_a_running_executor_is_reused():
+    r = _radius()
+    with futures.ThreadPoolExecutor(2) as pool:
+        results = parallel_geometry_kernel(r, ('area',), 'float32',
+                                           executor=pool, min_rows=0)
+    assert results['area'].dtype == np.float32
+    np.testing.assert_array_equal(
+        results['area'], geometry_kernel(r, ('area',), 'float32')['area'])
+
+
+def test_unknown_executor():
+    with pytest.raises(ValueError):
+        parallel_geometry_kernel(_radius(), executor='gpu', workers=2,
+                                 min_rows=0)
+
+
+def test_circle_calculations_in_parallel():
+    serial = pd.DataFrame({'radius': _radius(100)})
+    threaded = serial.copy()
+    circle_calculations(serial)
+    circle_calculations(threaded, executor='thread', workers=2)
+    pd.testing.assert_frame_equal(serial, threaded)
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from render_tools.daily_store import DailyStore, ingest_daily
+from render_tools.render_cache import RenderCache
+from year_heatmap.daily_cache import DailyCache
+from year_heatmap.year_heatmap import year_heatmap
+
+
+def _daily(start, days):
+    index = pd.date_range(start, periods=days, freq='D')
+    return pd.DataFrame({'a': np.arange(days, dtype=float)}, index=index)
+
+
+def test_functions_with_one_name_get_different_keys(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    df = _daily('2019-01-01', 365)
+    high = cache.key(year_heatmap, df, how=lambda a: a.max())
+    low = cache.key(year_heatmap, df, how=lambda a: a.min())
+    assert high != low
+    assert high == cache.key(year_heatmap, df, how=lambda a: a.max())
+
+    def scaled(factor):
+        return lambda a: a.sum() * factor
+    assert (cache.key(year_heatmap, df, how=scaled(1))
+            != cache.key(year_heatmap, df, how=scaled(2)))
+
+
+def test_appending_to_a_store_changes_its_key(tmp_path):
+    cache = RenderCache(str(tmp_path / 'images'))
+    path = str(tmp_path / 'a.days')
+    ingest_daily(path, _daily('2019-01-01', 100))
+    store = DailyStore(path)
+    before = cache.key(year_heatmap, store)
+
+    writer = DailyStore(path, 'r+')
+    writer.append(_daily('2019-04-11', 10))
+    store.refresh()
+    assert cache.key(year_heatmap, store) != before
+
+
+def test_daily_cache_is_not_part_of_the_key(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    df = _daily('2019-01-01', 365)
+    assert (cache.key(year_heatmap, df, cache=DailyCache())
+            == cache.key(year_heatmap, df))
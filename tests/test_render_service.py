@@ -0,0 +1,59 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from render_service.client import RenderClient, RenderError
+from render_service.service import RenderService
+
+
+def _serve_and_render(path, requests):
+    """
+    Start a service on a local socket, send the first request, then the
+    rest at once while it is drawing, and return the replies in order
+    """
+    async def one(port, kwargs):
+        async with RenderClient('127.0.0.1', port) as client:
+            try:
+                image = await client.render('heat_stripes', 'temps', **kwargs)
+            except RenderError as e:
+                return e.status, e, client.last_reply
+            return 'ok', image, client.last_reply
+
+    async def run():
+        service = RenderService({'temps': path}, workers=1, max_pending=1)
+        port = await service.start('127.0.0.1', 0)
+        try:
+            first = asyncio.ensure_future(one(port, requests[0]))
+            while not service._inflight:
+                await asyncio.sleep(0.001)
+            replies = await asyncio.gather(
+                first, *[one(port, kwargs) for kwargs in requests[1:]])
+            return replies, service.metrics()
+        finally:
+            await service.close()
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def temps(tmp_path):
+    df = pd.DataFrame({'t': np.random.default_rng(0).random(150)},
+                      index=range(1870, 2020))
+    path = str(tmp_path / 'temps.pkl')
+    df.to_pickle(path)
+    return path
+
+
+def test_identical_jobs_share_one_render_and_the_rest_are_busy(temps):
+    replies, metrics = _serve_and_render(temps, [
+        {'col': 't'}, {'col': 't'}, {'col': 't', 'mode': 'raster'}])
+    (status1, png1, reply1), (status2, png2, reply2), (status3, _, _) = replies
+
+    assert status1 == status2 == 'ok'
+    assert png1.startswith(b'\x89PNG') and png1 == png2
+    assert not reply1['coalesced'] and reply2['coalesced']
+    assert status3 == 'busy'
+    assert metrics['ok'] == 2 and metrics['busy'] == 1
+    assert metrics['coalesced'] == 1 and metrics['pending'] == 0
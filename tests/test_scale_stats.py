@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from render_tools.scale_stats import QuantileSketch, ScaleStats
+
+
+def _frame(rows=50000):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'a': rng.normal(10, 3, rows),
+                       'b': rng.exponential(2, rows)})
+    df.iloc[::13, 1] = np.nan
+    return df
+
+
+def test_chunks_give_the_moments_of_the_whole_frame():
+    df = _frame()
+    stats = ScaleStats(sketch_size=None)
+    for start in range(0, len(df), 7000):
+        stats.add(df.iloc[start:start + 7000])
+    summary = stats.summary()
+    expected = df.agg(['count', 'mean', 'std', 'min', 'max']).T
+    pd.testing.assert_frame_equal(summary, expected, check_dtype=False)
+
+
+def test_clip_limits_are_close_to_the_percentiles():
+    df = _frame()
+    stats = ScaleStats(sketch_size=1024)
+    for start in range(0, len(df), 5000):
+        stats.add(df.iloc[start:start + 5000])
+    for col in df.columns:
+        low, high = stats.limits(col, clip=(2, 98))
+        ranks = df[col].dropna().rank(pct=True)
+        values = df[col].dropna()
+        # Within one percent of rank of the exact percentiles
+        assert 0.01 <= ranks[values <= low].max() <= 0.03
+        assert 0.97 <= ranks[values <= high].max() <= 0.99
+    assert stats.limits('a') == (df['a'].min(), df['a'].max())
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        ScaleStats().mean()
+    stats = ScaleStats(sketch_size=None).add(_frame())
+    with pytest.raises(ValueError):
+        stats.add(_frame()[['b', 'a']])
+    with pytest.raises(ValueError):
+        stats.limits('a', clip=(2, 98))
+
+
+def test_empty_sketch():
+    assert np.isnan(QuantileSketch().add([np.nan]).quantile(0.5))
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from matplotlib import colors as mcolors
+
+from year_heatmap.year_heatmap import year_heatmap
+
+
+def _calendar_rows(ax):
+    """Mesh rows holding calendar cells, from the first mesh of the axes"""
+    data = np.ma.getdata(ax.collections[0].get_array())
+    mask = np.ma.getmaskarray(ax.collections[0].get_array())
+    # Rows outside every calendar are painted with -1 by the first mesh
+    outside = ~mask & (data == -1)
+    return set(np.flatnonzero(~outside.all(axis=1)))
+
+
+def test_single_layout_labels_line_up_with_mesh_rows():
+    rng = np.random.default_rng(0)
+    days = pd.date_range('2019-01-01', '2020-12-31', freq='D')
+    df = pd.DataFrame({'a': rng.random(len(days)),
+                       'b': rng.random(len(days))}, index=days)
+
+    fig, ax = year_heatmap(df, how=None, layout='single')
+    rows = _calendar_rows(ax)
+
+    # Every day label sits in the middle of a calendar row
+    ticks = np.asarray(ax.get_yticks()) - 0.5
+    assert len(ticks) == 4 * 7
+    assert np.allclose(ticks, np.round(ticks))
+    assert set(np.round(ticks).astype(int)) <= rows
+
+    # Every column title sits just above the seven rows of its calendar
+    titles = [t for t in ax.texts if t.get_text() in ('a', 'b')]
+    assert len(titles) == 4
+    for title in titles:
+        bottom = title.get_position()[1] - 7.2
+        assert np.isclose(bottom, round(bottom))
+        bottom = int(round(bottom))
+        assert set(range(bottom, bottom + 7)) <= rows
+        assert bottom + 7 not in rows
+
+
+def test_single_layout_takes_colormap_objects():
+    days = pd.date_range('2019-01-01', '2019-12-31', freq='D')
+    df = pd.DataFrame({'a': np.arange(len(days), dtype=float),
+                       'b': np.arange(len(days), dtype=float)}, index=days)
+    greens = mcolors.ListedColormap(['#e5f5e0', '#31a354'])
+    reds = mcolors.ListedColormap(['#fee0d2', '#de2d26'])
+
+    fig, ax = year_heatmap(df, how=None, layout='single',
+                           colour_map=[greens, reds])
+    assert len(ax.collections) == 2
+    fig, ax = year_heatmap(df, how=None, layout='single',
+                           colour_map=[greens, greens])
+    assert len(ax.collections) == 1
@@ -0,0 +1,147 @@
+# Level of detail for the text of a wedge plot.
+# Text is the most expensive thing to draw in a wedge plot with many
+# slices, and when slices are narrow most labels overlap and cannot be
+# read anyway.  Before any Text artists are made, the size of every label
+# in pixels is estimated from the font size and the sector it sits in,
+# and each ring of labels is thinned to every n-th slice so that neighbours
+# do not overlap, or dropped where a label is longer than its ring is wide.
+# A cap on the number of labels thins them further.
+from collections import namedtuple
+
+from render_tools.lazy_import import lazy_import
+
+font_manager = lazy_import('matplotlib.font_manager')
+np = lazy_import('numpy')
+
+# Width of an average character and the gap kept between neighbouring
+# labels, as fractions of the font size
+CHAR_WIDTH = 0.6
+LABEL_SPACING = 1.2
+
+LabelLayout = namedtuple('LabelLayout', [
+    'slices',     # indices of the slices given an outer label
+    'wedges',     # per ring (in ring_values order), indices of the slices
+                  # whose wedge is labelled
+    'requested',  # number of slice and wedge labels asked for
+    'drawn',      # number of them that fit and are drawn
+])
+
+
+def font_pixels(fontsize, dpi):
+    """Height in pixels of a font size, in points or a name like 'large'"""
+    points = font_manager.FontProperties(size=fontsize).get_size_in_points()
+    return points * dpi / 72
+
+
+def data_scale(ax, limit=1.25):
+    """
+    Pixels per data unit of a square axes showing -limit to limit, as
+    wedge_plot sets it up
+    """
+    return min(ax.bbox.width, ax.bbox.height) / (2 * limit)
+
+
+def label_extents(labels, theta, font_px, rotate):
+    """
+    Tangential and radial extent, in pixels, of each label centred at
+    angles theta.  Rotated labels run along their radius, others are
+    horizontal and their box is projected on to both directions
+    """
+    width = np.array([len(str(label)) for label in labels],
+                     dtype=float) * CHAR_WIDTH * font_px
+    height = np.full(len(width), float(font_px))
+    if rotate:
+        return height, width
+    theta = np.deg2rad(theta)
+    sin, cos = np.abs(np.sin(theta)), np.abs(np.cos(theta))
+    return width * sin + height * cos, width * cos + height * sin
+
+
+def thin(count, tangential, arc):
+    """
+    Slice indices to label so that labels spaced `arc` pixels apart
+    (the arc length of one slice) do not overlap
+    """
+    if count == 0 or len(tangential) == 0 or arc <= 0:
+        return np.arange(0)
+    need = LABEL_SPACING * np.max(tangential)
+    stride = max(int(np.ceil(need / arc)), 1)
+    return np.arange(0, count, stride)
+
+
+def cap_labels(groups, max_labels):
+    """
+    Thin every group of slice indices by the same further stride until
+    there are at most max_labels in all.  If one label left in each group
+    is still too many, only the first max_labels groups keep theirs
+    """
+    if max_labels is None:
+        return groups
+    if max_labels < 0:
+        raise ValueError('max_labels must be 0 or more, not {}'
+                         .format(max_labels))
+    longest = max((len(g) for g in groups), default=0)
+    factor = 1
+    thinned = list(groups)
+    while sum(len(g) for g in thinned) > max_labels and factor < longest:
+        factor += 1
+        thinned = [g[::factor] for g in groups]
+    if sum(len(g) for g in thinned) > max_labels:
+        # every group is down to one label, the one of its first slice
+        kept = 0
+        for i, g in enumerate(thinned):
+            thinned[i] = g[:1] if kept < max_labels else g[:0]
+            kept += len(thinned[i])
+    return thinned
+
+
+def layout_labels(theta, step, scale, font_px, slice_labels=None,
+                  slice_radius=None, slice_rotate=True, rings=(),
+                  wedge_rotate=True, max_labels=None):
+    """
+    Decide which labels of a wedge plot fit
+    Input:
+        theta -- middle angle of each slice, degrees
+        step -- angle of one slice, degrees
+        scale -- pixels per data unit
+        font_px -- label font height in pixels
+        slice_labels -- outer label strings, or None if they are hidden
+        slice_radius -- distance of the outer labels from the centre
+        slice_rotate -- whether outer labels run along their radius
+        rings -- list of (label strings, radius, width) for each ring whose
+                 wedge labels are shown, or (None, radius, width) if not
+        wedge_rotate -- whether wedge labels run along their radius
+        max_labels -- most slice and wedge labels in all, None for no cap
+    Output:
+        a LabelLayout
+    """
+    num_slices = len(theta)
+    step_radians = np.deg2rad(step)
+    groups = []
+    requested = 0
+
+    if slice_labels is not None:
+        requested += num_slices
+        tangential, _ = label_extents(slice_labels, theta, font_px,
+                                      slice_rotate)
+        groups.append(thin(num_slices, tangential,
+                           slice_radius * step_radians * scale))
+    else:
+        groups.append(np.arange(0))
+
+    for labels, radius, width in rings:
+        if labels is None:
+            groups.append(np.arange(0))
+            continue
+        requested += num_slices
+        tangential, radial = label_extents(labels, theta, font_px,
+                                           wedge_rotate)
+        # Labels longer than the ring is wide are dropped, the rest thinned
+        fits = radial <= width * scale
+        shown = thin(num_slices, tangential[fits],
+                     (radius - width / 2) * step_radians * scale)
+        groups.append(shown[fits[shown]])
+
+    groups = cap_labels(groups, max_labels)
+    return LabelLayout(groups[0], groups[1:], requested,
+                       sum(len(g) for g in groups))
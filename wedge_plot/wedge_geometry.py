@@ -0,0 +1,57 @@
+# Geometry of the annular sectors that make up a wedge plot.
+# All sectors of a ring are computed in one numpy pass so that a whole
+# ring (or plot) can be drawn as a single PolyCollection instead of
+# one Wedge patch per slice.
+from render_tools.lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+
+def slice_angles(num_slices, all_slices_percent, startangle):
+    """
+    Start, end and middle angle (degrees) of each slice, laid out
+    anticlockwise from startangle as ax.pie does for a partial pie
+    """
+    step = 360 * all_slices_percent / num_slices
+    theta1 = startangle + step * np.arange(num_slices)
+    return theta1, theta1 + step, theta1 + step / 2
+
+
+def sector_vertices(theta1, theta2, radius, width=None, resolution=1):
+    """
+    Polygon vertices of annular sectors between angles theta1 and theta2
+    (degrees), with outer radius and ring width.  If width is None or
+    not less than radius the sectors are full pie slices.
+
+    Arcs are sampled at least every `resolution` degrees.  Returns an
+    array of shape (number of sectors, 2 * points, 2): the outer arc
+    anticlockwise followed by the inner arc clockwise.
+    """
+    theta1 = np.atleast_1d(np.asarray(theta1, dtype=float))
+    theta2 = np.atleast_1d(np.asarray(theta2, dtype=float))
+    span = np.max(np.abs(theta2 - theta1))
+    points = max(int(np.ceil(span / resolution)), 1) + 1
+
+    steps = np.linspace(0, 1, points)
+    angles = np.deg2rad(theta1[:, np.newaxis]
+                        + (theta2 - theta1)[:, np.newaxis] * steps)
+    unit = np.stack([np.cos(angles), np.sin(angles)], axis=-1)
+
+    inner_radius = 0 if width is None else max(radius - width, 0)
+    return np.concatenate([radius * unit,
+                           inner_radius * unit[:, ::-1]], axis=1)
+
+
+def label_positions(theta, distance):
+    """x, y coordinates at distance from the centre along angles theta"""
+    theta = np.deg2rad(theta)
+    return distance * np.cos(theta), distance * np.sin(theta)
+
+
+def label_rotations(theta):
+    """
+    Rotation (degrees) that lines labels up along their radius while
+    keeping them the right way up, as ax.pie does with rotatelabels
+    """
+    theta = np.asarray(theta, dtype=float)
+    return theta + np.where(np.cos(np.deg2rad(theta)) > 0, 0, 180)
@@ -1,9 +1,21 @@
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-from matplotlib.cm import ScalarMappable
-import numpy as np
+from contextlib import nullcontext
 
+from render_tools.lazy_import import lazy_import
+
+from .label_layout import LabelLayout, data_scale, font_pixels, layout_labels
+from .wedge_geometry import label_positions, label_rotations, sector_vertices, slice_angles
 from .wedge_plot_defaults import default_label_format, default_legend_tick, wedge_defaults
+from .wedge_plot_handle import WedgePlotHandle, legend_ticks
+
+backend_agg = lazy_import('matplotlib.backends.backend_agg')
+cm = lazy_import('matplotlib.cm')
+mcollections = lazy_import('matplotlib.collections')
+mcolors = lazy_import('matplotlib.colors')
+mfigure = lazy_import('matplotlib.figure')
+mpatches = lazy_import('matplotlib.patches')
+np = lazy_import('numpy')
+
+_NO_PHASE = nullcontext()
 
 def wedge_plot(df, ring_values=None, slice_labels=None, colours=None,
         radius=None, wedge_width=None, wedge_labels=None,startangle=-30,  
@@ -29,7 +41,9 @@ def wedge_plot(df, ring_values=None, slice_labels=None, colours=None,
         
         figsize=(10,10), edgecolour='k',
         linewidth=1.4, label_fontsize='large', label_fontweight='semibold',
-        blankcolour='w', ls='-',alpha=1):
+        blankcolour='w', ls='-',alpha=1, return_handle=False,
+        label_detail='auto', max_labels=500,
+        fig=None, ax=None, profile=None):
     """
     Produce a wedge plot figure from columns in the dataframe
 
@@ -106,6 +120,15 @@ def wedge_plot(df, ring_values=None, slice_labels=None, colours=None,
                                  label
             slice_label_rotate -- whether the slice labels should be rotated
             explode -- gap between all wedges in a slice (0 for no gap)
+            label_detail -- 'auto' estimates the size of each slice and
+                            wedge label at the figure size and font before
+                            drawing, and labels only every n-th slice of a
+                            ring where neighbours would overlap, and drops
+                            wedge labels longer than their ring is wide.
+                            'all' labels every slice and wedge
+            max_labels -- for 'auto', the most slice and wedge labels to
+                          draw in all.  Rings are thinned further to keep
+                          under it.  None for no limit
         Centre circle and plot title parameters:
             circle_label -- label to show in the centre circle
             circle_fontsize -- font size of circle label
@@ -126,6 +149,20 @@ def wedge_plot(df, ring_values=None, slice_labels=None, colours=None,
             blankcolour -- background colour of centre circle and slice labels
             ls -- line style of circle and wedges
             alpha -- alpha setting for all colours
+            return_handle -- if True, return a WedgePlotHandle instead of
+                             the figure.  Its update(df) method refreshes
+                             the colours, wedge labels and legends with
+                             new values without rebuilding the plot, and
+                             its label_layout records the labels drawn
+            fig -- a matplotlib Figure to draw on.  If None, a new Figure
+                   of figsize with an Agg canvas is made, without pyplot
+            ax -- an Axes to draw the wedges on.  Default is a new
+                  subplot filling fig
+            profile -- called with the name of each phase of the plot,
+                       'figure', 'labels', 'artists', 'legend' and
+                       'layout', and used as a context manager around
+                       it, such as render_tools' PhaseProfile.  Phases
+                       run once per ring are entered once per ring
     """
     # A slice is a row of data across all columns
     #     A single triangular pizza slice
@@ -134,6 +171,8 @@ def wedge_plot(df, ring_values=None, slice_labels=None, colours=None,
     # A ring is a column of data
     #     Wedges from each slice in the same layer
     
+    phase = profile or _no_phase
+
     if ring_values is None:
         ring_values = df.columns.tolist()
     if slice_labels is None:
@@ -156,7 +195,14 @@ def wedge_plot(df, ring_values=None, slice_labels=None, colours=None,
     wedges = wedge_defaults(num_wedges)
     wedges.update(wedge_params)    
     
-    fig, ax = plt.subplots(figsize=figsize)
+    with phase('figure'):
+        if ax is not None:
+            fig = ax.figure
+        else:
+            if fig is None:
+                fig = mfigure.Figure(figsize=figsize)
+                backend_agg.FigureCanvasAgg(fig)
+            ax = fig.add_subplot()
     
     # Replace any None values with the column name of ring_values
     if wedge_labels is None:
@@ -168,50 +214,77 @@ def wedge_plot(df, ring_values=None, slice_labels=None, colours=None,
     wedges['radius'] = [r+i*explode for i, r in enumerate(wedges['radius'])]
     circle_radius = wedges['radius'][0] - wedges['wedge_width'][0] - explode
     
-    # centre circle first
-    if not hide_centre_circle:
-        centre_circle = plt.Circle((0, 0),
+    with phase('artists'):
+        # centre circle first
+        if not hide_centre_circle:
+            centre_circle = mpatches.Circle((0, 0),
                                 circle_radius, 
                                 color=blankcolour, 
                                 ls=ls, 
                                 ec=edgecolour, 
                                 lw=linewidth)
-        centre_label = ax.annotate(circle_label, 
-                                xy=(0, 0), 
-                                fontsize=circle_fontsize, 
-                                ha=circle_ha, 
-                                va=circle_va)
-        ax.add_artist(centre_circle)
+            centre_label = ax.annotate(circle_label, 
+                                    xy=(0, 0), 
+                                    fontsize=circle_fontsize, 
+                                    ha=circle_ha, 
+                                    va=circle_va)
+            ax.add_artist(centre_circle)
     
-    # Add each wedge from outer to inner for each slice of data
-    slice_sizes = [all_slices_percent/num_slices]*num_slices
+    # Angles of every slice, shared by all rings
+    theta1, theta2, thetam = slice_angles(num_slices, all_slices_percent, startangle)
     
+    outer_radius = wedges['radius'][num_wedges-1]
+    ring_widths = [min(w, r) for w, r in zip(wedges['wedge_width'], wedges['radius'])]
+
+    # Decide which labels fit before any text is made
+    with phase('labels'):
+        # run a custom function to format the labels
+        ring_labels = [None if hide_wedge_label else
+                       [wedge_label_format(c) for c in df[ring].tolist()]
+                       for ring in ring_values]
+        if label_detail == 'auto':
+            label_layout = layout_labels(
+                thetam, 360*all_slices_percent/num_slices, data_scale(ax),
+                font_pixels(label_fontsize, fig.dpi),
+                slice_labels=None if hide_slice_label else slice_labels,
+                slice_radius=(1 + slice_label_nudge)*outer_radius,
+                slice_rotate=slice_label_rotate,
+                rings=list(zip(ring_labels, wedges['radius'], ring_widths)),
+                wedge_rotate=wedge_label_rotate, max_labels=max_labels)
+        elif label_detail == 'all':
+            every = np.arange(num_slices)
+            none = np.arange(0)
+            groups = [none if hide_slice_label else every]
+            groups += [none if labels is None else every for labels in ring_labels]
+            count = sum(len(g) for g in groups)
+            label_layout = LabelLayout(groups[0], groups[1:], count, count)
+        else:
+            raise ValueError("label_detail must be 'auto' or 'all', "
+                             "not {!r}".format(label_detail))
+
     # add the outer labels first
-    if not hide_slice_label:
-        labels = slice_labels
-        outer_labels = ax.pie(slice_sizes, 
-                    radius=wedges['radius'][num_wedges-1],
-                    startangle=startangle, 
-                    colors=[blankcolour]*num_slices, 
-                    labels=labels,
-                    labeldistance=1 + slice_label_nudge,
-                    rotatelabels=slice_label_rotate,
-                    textprops=dict(fontsize=label_fontsize, 
-                                   weight=label_fontweight,
-                                   va='center', 
-                                   wrap=True))
-                                   
-        # Set correct label ha for all wedge angles
-        slice_angle = 360*all_slices_percent/num_slices
+    with phase('labels'):
+        if not hide_slice_label:
+            ax.add_collection(mcollections.PolyCollection(sector_vertices(theta1, theta2, outer_radius),
+                                             facecolors=blankcolour, edgecolors='none',
+                                             clip_on=False))
 
-        for i, s in enumerate(outer_labels[1]):
-            angle = startangle + (i+0.5)*slice_angle
-            if -90 <= angle <= 90:
-                s.set_ha('left')
-            else:
-                s.set_ha('right')
+            # Set correct label ha for all wedge angles
+            shown = label_layout.slices
+            angles = thetam[shown]
+            label_x, label_y = label_positions(angles, (1 + slice_label_nudge)*outer_radius)
+            rotations = label_rotations(angles) if slice_label_rotate else [0]*len(shown)
+            has = np.where((angles >= -90) & (angles <= 90), 'left', 'right')
+            for i, ha, x, y, rotation in zip(shown, has, label_x, label_y, rotations):
+                ax.text(x, y, slice_labels[i], ha=ha,
+                        va='center', rotation=rotation, clip_on=False,
+                        fontsize=label_fontsize, weight=label_fontweight, wrap=True)
     
-    # build rings from ouside in
+    # build rings from ouside in, gathering every wedge into one collection
+    ring_vertices = []
+    ring_colours = []
+    ring_label_vertices = []
+    rings = []
     ring_values.reverse()       
     for idx, ring in enumerate(ring_values):
         idx = num_wedges - idx - 1
@@ -219,75 +292,93 @@ def wedge_plot(df, ring_values=None, slice_labels=None, colours=None,
         vmin=min(ring_values)
         vmax=max(ring_values)
         
-        # run a custom function to format the labels
-        labels = [wedge_label_format(c) for c in ring_values]
-        if hide_wedge_label:
-            labels = [''] * num_slices
+        with phase('artists'):
+            norm = mcolors.Normalize(vmin=vmin, vmax=vmax, clip=True)
+            mapper = cm.ScalarMappable(norm=norm, cmap=wedges['colours'][idx])
         
-        norm = mpl.colors.Normalize(vmin=vmin, vmax=vmax, clip=True)
-        mapper = ScalarMappable(norm=norm, cmap=wedges['colours'][idx])
-        
-        radius = wedges['radius'][idx]
-        width = min(wedges['wedge_width'][idx], radius)
-        label_distance = (radius - width/2)/radius
+            radius = wedges['radius'][idx]
+            width = ring_widths[idx]
+            label_distance = (radius - width/2)/radius
+
+            ring_vertices.append(sector_vertices(theta1, theta2, radius, width))
+            ring_colours.append(mapper.to_rgba(ring_values, alpha=alpha))
 
-        layer = ax.pie(slice_sizes, 
-                            radius=radius,
-                            startangle=startangle, 
-                            colors=mapper.to_rgba(ring_values, alpha=alpha), 
-                            labels=labels, 
-                            rotatelabels=wedge_label_rotate,
-                            labeldistance=label_distance,
-                            wedgeprops=dict(width=width, 
-                                            edgecolor=edgecolour,linewidth= linewidth),
-                            textprops=dict(fontsize=label_fontsize,weight=label_fontweight,
-                                           va='center', ha='center',wrap=True))
+        with phase('labels'):
+            shown = label_layout.wedges[idx]
+            angles = thetam[shown]
+            label_x, label_y = label_positions(angles, radius - width/2)
+            rotations = label_rotations(angles) if wedge_label_rotate else [0]*len(shown)
+            wedge_texts = [ax.text(x, y, ring_labels[idx][i], ha='center', va='center',
+                                   rotation=rotation, clip_on=False, fontsize=label_fontsize,
+                                   weight=label_fontweight, wrap=True)
+                           for i, x, y, rotation in zip(shown, label_x, label_y, rotations)]
                             
         # Place the legend
-        if not hide_legend:
-            axcmap = plt.axes([1+legend_x_start, 1+legend_y_start-idx*legend_gap, 
-                                 legend_boxwidth,legend_boxheight])
+        cbar = None
+        with phase('legend'):
+            if not hide_legend:
+                axcmap = fig.add_axes([1+legend_x_start, 1+legend_y_start-idx*legend_gap, 
+                                       legend_boxwidth,legend_boxheight])
             
-            ticks, tick_labels = default_legend_tick(ring_values, round_to=legend_label_round_to)
-            
-            if legend_units is not None:
-                if type(legend_units)==str:
-                    unit_label = legend_units
-                else:
-                    unit_label = legend_units[idx]
-                tick_labels[-1] = '{} {}'.format(tick_labels[-1], unit_label)
+                ticks, tick_labels = legend_ticks(ring_values, idx, legend_label_round_to,
+                                                  legend_units)
+
+                cbar = fig.colorbar(mapper,cax=axcmap, orientation="horizontal",ticks=ticks, alpha=alpha)
+                cbar.ax.set_xticklabels(tick_labels) 
 
-            cbar = plt.colorbar(mapper,cax=axcmap, orientation="horizontal",ticks=ticks, alpha=alpha)
-            cbar.ax.set_xticklabels(tick_labels) 
+                cbar.set_label(wedges['wedge_labels'][idx],
+                               weight=legend_fontweight, 
+                               fontsize=legend_fontsize, fontstyle=legend_fontstyle)
 
-            cbar.set_label(wedges['wedge_labels'][idx],
-                           weight=legend_fontweight, 
-                           fontsize=legend_fontsize, fontstyle=legend_fontstyle)
+        start = len(rings) * num_slices
+        rings.append({'column': ring, 'index': idx, 'mapper': mapper,
+                      'wedges': (start, start + num_slices),
+                      'labels': wedge_texts, 'label_slices': shown,
+                      'colorbar': cbar})
         
         # Place the legend label on the ring
-        if not hide_ring_label:
-            ring_label_angle = startangle + 360*all_slices_percent
-            if -180 <=ring_label_angle <= 0:
-                ring_label_just = 'left'
-            else:
-                ring_label_just = 'right'
-            ring_label = ax.pie([0.01], 
-                    radius=radius,
-                    startangle=ring_label_angle, 
-                    colors='w', 
-                    labels=[wedges['wedge_labels'][idx]], 
-                    rotatelabels=False,
-                    labeldistance=label_distance,
-                    wedgeprops=dict(width=width),
-                    textprops=dict(fontsize=legend_fontsize,weight=legend_fontweight,
-                                   fontstyle=legend_fontstyle,
-                                   va='center', ha=ring_label_just,wrap=True))
+        with phase('labels'):
+            if not hide_ring_label:
+                ring_label_angle = startangle + 360*all_slices_percent
+                if -180 <=ring_label_angle <= 0:
+                    ring_label_just = 'left'
+                else:
+                    ring_label_just = 'right'
+                ring_label_vertices.append(sector_vertices(ring_label_angle, ring_label_angle + 3.6,
+                                                           radius, width))
+                x, y = label_positions(ring_label_angle + 1.8, radius - width/2)
+                ax.text(x, y, wedges['wedge_labels'][idx], ha=ring_label_just,
+                        va='center', clip_on=False, fontsize=legend_fontsize,
+                        weight=legend_fontweight, fontstyle=legend_fontstyle, wrap=True)
 
-                            
-                
-    ax.set(aspect="equal")
-    if title is not None:
-        fig.suptitle(title, x=title_x, y=title_y, fontsize=title_fontsize,
-                     fontweight=title_fontweight)
-    
+    with phase('artists'):
+        wedge_collection = mcollections.PolyCollection(np.concatenate(ring_vertices),
+                                          facecolors=np.concatenate(ring_colours),
+                                          edgecolors=edgecolour, linewidths=linewidth,
+                                          clip_on=False)
+        ax.add_collection(wedge_collection)
+        if ring_label_vertices:
+            ax.add_collection(mcollections.PolyCollection(np.concatenate(ring_label_vertices),
+                                             facecolors='w', edgecolors='none',
+                                             clip_on=False))
+
+    with phase('layout'):
+        ax.set(frame_on=False, xticks=[], yticks=[], xlim=(-1.25, 1.25), ylim=(-1.25, 1.25))
+        ax.set(aspect="equal")
+        if title is not None:
+            fig.suptitle(title, x=title_x, y=title_y, fontsize=title_fontsize,
+                         fontweight=title_fontweight)
+
+    if return_handle:
+        return WedgePlotHandle(fig, ax, wedge_collection, rings, alpha=alpha,
+                               wedge_label_format=wedge_label_format,
+                               hide_wedge_label=hide_wedge_label,
+                               legend_label_round_to=legend_label_round_to,
+                               legend_units=legend_units,
+                               label_layout=label_layout)
     return fig
+
+
+def _no_phase(name):
+    """Profile used when none is given, which records nothing"""
+    return _NO_PHASE
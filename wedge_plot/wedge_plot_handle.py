@@ -0,0 +1,81 @@
+from .wedge_plot_defaults import default_legend_tick
+
+
+class WedgePlotHandle:
+    """
+    Handle on a drawn wedge plot which refreshes it with new values in
+    place.  Returned by wedge_plot(..., return_handle=True).
+
+    update() only recomputes the colour limits, wedge colours, wedge
+    label strings and legend ticks of each ring and changes the existing
+    artists, so it is much cheaper than drawing a new wedge plot.  The
+    new data must have the same slices (rows) and ring columns.
+
+    Attributes:
+        fig -- the matplotlib figure
+        ax -- the axes holding the wedges
+        label_layout -- LabelLayout of the slices and wedges labelled
+    """
+    def __init__(self, fig, ax, wedge_collection, rings, alpha=1,
+                 wedge_label_format=str, hide_wedge_label=False,
+                 legend_label_round_to=1, legend_units=None,
+                 label_layout=None):
+        self.fig = fig
+        self.ax = ax
+        self.wedge_collection = wedge_collection
+        self.rings = rings
+        self.alpha = alpha
+        self.wedge_label_format = wedge_label_format
+        self.hide_wedge_label = hide_wedge_label
+        self.legend_label_round_to = legend_label_round_to
+        self.legend_units = legend_units
+        self.label_layout = label_layout
+
+    def update(self, df):
+        """
+        Refresh the plot with the values in df and request a redraw.
+        Returns the figure.
+        """
+        facecolors = self.wedge_collection.get_facecolor().copy()
+        for ring in self.rings:
+            values = df[ring['column']].tolist()
+            start, stop = ring['wedges']
+            if len(values) != stop - start:
+                raise ValueError('Expected {} slices in column {}, got {}'
+                                 .format(stop - start, ring['column'], len(values)))
+
+            # Changing the limits in place also updates the colorbar
+            mapper = ring['mapper']
+            mapper.set_clim(min(values), max(values))
+            facecolors[start:stop] = mapper.to_rgba(values, alpha=self.alpha)
+
+            if not self.hide_wedge_label:
+                for text, i in zip(ring['labels'], ring['label_slices']):
+                    text.set_text(self.wedge_label_format(values[i]))
+
+            if ring['colorbar'] is not None:
+                ticks, tick_labels = legend_ticks(values, ring['index'],
+                                                  self.legend_label_round_to,
+                                                  self.legend_units)
+                ring['colorbar'].set_ticks(ticks)
+                ring['colorbar'].ax.set_xticklabels(tick_labels)
+
+        self.wedge_collection.set_facecolor(facecolors)
+        self.fig.canvas.draw_idle()
+        return self.fig
+
+
+def legend_ticks(values, idx, round_to=1, legend_units=None):
+    """
+    Ticks and tick labels for the legend of ring idx, with the units
+    added to the last label
+    """
+    ticks, tick_labels = default_legend_tick(values, round_to=round_to)
+
+    if legend_units is not None:
+        if type(legend_units)==str:
+            unit_label = legend_units
+        else:
+            unit_label = legend_units[idx]
+        tick_labels[-1] = '{} {}'.format(tick_labels[-1], unit_label)
+    return ticks, tick_labels
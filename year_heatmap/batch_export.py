@@ -0,0 +1,114 @@
+"""
+Batch export of year_heatmap calendars to image files.
+
+The data is aggregated by day once, handed to each worker process once
+when the pool starts, and every (columns, year) job is then rendered on
+an Agg canvas and saved to its own file.
+"""
+
+import os
+import time
+
+from render_tools.lazy_import import lazy_import
+
+from .daily_aggregate import daily_aggregate
+from .year_heatmap import _prepare_figure, year_heatmap
+
+futures = lazy_import('concurrent.futures')
+
+# Daily data shared by all jobs in a worker process
+_by_day = None
+
+
+def export_year_heatmaps(df, jobs, out_dir, fmt='png', time_col=None,
+                         how='sum', processes=None, dpi=None, **kwargs):
+    """
+    Render many calendar heatmaps in parallel, one file per job.
+
+    Parameters
+    ----------
+    df : DataFrame
+        Data for the plots, as for `year_heatmap`.
+    jobs : list of (columns, year)
+        columns is a column name or list of column names to plot together
+        and year the single year to plot (or None for every year).
+    out_dir : str
+        Directory the files are written to.  Created if it does not exist.
+    fmt : str
+        Image format, such as 'png' or 'svg'.
+    time_col: str
+        Name of column where time series data is.  Default is the index
+    how : string, callable or dict
+        Method for aggregating data by day, as for `year_heatmap`.  The
+        aggregation is done once, before any job is started.
+    processes : int
+        Number of worker processes.  Default is the number of CPUs.
+    dpi : float
+        Resolution of raster output.  Default is the matplotlib default.
+    kwargs : other keyword arguments
+        All other keyword arguments are passed to `year_heatmap`.
+    Returns
+    -------
+    list of dict
+        One entry per job, in the order given, with the 'columns', 'year'
+        and 'path' of the file and the 'build' and 'save' times and
+        'total' time of the job in seconds.
+    """
+    if time_col is None:
+        row_data = df
+    else:
+        row_data = df.set_index(time_col)
+    columns = sorted({c for cols, _ in jobs for c in _as_list(cols)},
+                     key=row_data.columns.get_loc)
+    by_day = row_data[columns]
+    if how is not None:
+        by_day = daily_aggregate(by_day, how)
+
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = []
+    for cols, year in jobs:
+        cols = _as_list(cols)
+        name = '{}_{}.{}'.format('_'.join(str(c) for c in cols),
+                                 'all' if year is None else year, fmt)
+        tasks.append((cols, year, os.path.join(out_dir, name), dpi, kwargs))
+
+    with futures.ProcessPoolExecutor(max_workers=processes,
+                                     initializer=_start_worker,
+                                     initargs=(by_day,)) as pool:
+        return list(pool.map(_render_job, tasks))
+
+
+def _as_list(cols):
+    return [cols] if type(cols) == str else list(cols)
+
+
+def _start_worker(by_day):
+    """
+    Keep the daily data for this worker, and draw a figure with text so
+    matplotlib and its font cache are loaded before the first job is
+    timed.
+    """
+    global _by_day
+    _by_day = by_day
+    fig = _prepare_figure(None, (1, 1))
+    fig.text(0.5, 0.5, 'warm', weight='bold')
+    fig.canvas.draw()
+
+
+def _render_job(task):
+    """Render and save one calendar, timing the build and save phases."""
+    cols, year, path, dpi, kwargs = task
+    start = time.perf_counter()
+    fig, _ = year_heatmap(_by_day, value_cols=cols, year=year, how=None,
+                          **kwargs)
+    built = time.perf_counter()
+    fig.savefig(path, dpi=dpi)
+    saved = time.perf_counter()
+    return {
+        'columns': cols,
+        'year': year,
+        'path': path,
+        'build': built - start,
+        'save': saved - built,
+        'total': saved - start,
+    }
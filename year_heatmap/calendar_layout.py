@@ -0,0 +1,64 @@
+"""
+Calendar geometry for year_heatmap.
+
+Where each day of a year falls in the 7 x 54 grid of calendar cells only
+depends on the year and on which weekday starts the week, so the tables
+are computed once per (year, firstweekday) and kept in an LRU cache.
+Weeks are counted from the one holding 1 January, which makes the week
+number fixups for early January and late December unnecessary.
+"""
+
+from collections import namedtuple
+import datetime
+from functools import lru_cache
+
+from render_tools.lazy_import import lazy_import
+
+np = lazy_import('numpy')
+
+YearLayout = namedtuple('YearLayout', [
+    'rows',         # cell row of each day of the year (0 = 1 January)
+    'cols',         # cell column of each day of the year
+    'width',        # number of week columns the year spans
+    'in_year',      # (7, 54) bool, True for cells holding a day of the year
+    'cell_day',     # (7, 54) day of the year in each cell, -1 outside it
+    'weekday_rows', # cell row of each weekday, Monday first
+    'month_ticks',  # x position of the week holding the 15th of each month
+])
+
+
+@lru_cache(maxsize=256)
+def year_layout(year, firstweekday=0):
+    """
+    Cell layout of a calendar year.
+
+    Days run down the rows from `firstweekday` (0 is Monday, 6 is
+    Sunday) at the top, row 6, to the last day of the week at row 0, and
+    along the columns week by week.  The returned arrays are shared
+    between callers and are read only.
+    """
+    jan1 = datetime.date(year, 1, 1)
+    num_days = (datetime.date(year + 1, 1, 1) - jan1).days
+    offset = (jan1.weekday() - firstweekday) % 7
+
+    cell = np.arange(num_days) + offset
+    rows = (6 - cell % 7).astype(np.int8)
+    cols = (cell // 7).astype(np.int8)
+
+    in_year = np.zeros((7, 54), dtype=bool)
+    in_year[rows, cols] = True
+    cell_day = np.full((7, 54), -1, dtype=np.int16)
+    cell_day[rows, cols] = np.arange(num_days)
+
+    weekday_rows = (6 - (np.arange(7) - firstweekday) % 7).astype(np.int8)
+
+    fifteenths = np.array([(datetime.date(year, month, 15) - jan1).days
+                           for month in range(1, 13)])
+    month_ticks = cols[fifteenths] + 0.5
+
+    layout = YearLayout(rows, cols, int(cols[-1]) + 1, in_year, cell_day,
+                        weekday_rows, month_ticks)
+    for table in layout:
+        if isinstance(table, np.ndarray):
+            table.setflags(write=False)
+    return layout
@@ -0,0 +1,290 @@
+"""
+Daily aggregation of time series data for year_heatmap.
+
+Timestamps are mapped to integer day ordinals and each column is reduced
+with `np.bincount` or `ufunc.reduceat`, which is much cheaper than
+`DataFrame.resample('D').agg` on long, irregular event logs.  Methods
+that have no vectorized kernel fall back to pandas for that column only.
+
+`DailyAccumulator` folds the same reductions over a stream of chunks so
+that data larger than memory can be aggregated a piece at a time.
+"""
+
+from render_tools.lazy_import import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Methods with a bincount/reduceat kernel.  Anything else (other pandas
+# method names, callables) is resampled by pandas.
+FAST_METHODS = ('sum', 'count', 'mean', 'min', 'max')
+
+
+def daily_aggregate(row_data, how='sum'):
+    """
+    Aggregate time series data by calendar day.
+
+    Parameters
+    ----------
+    row_data : DataFrame
+        Values to aggregate, indexed by a DatetimeIndex.  The index does
+        not need to be sorted.
+    how : string, callable or dict
+        Method for aggregating each day.  One of 'sum', 'count', 'mean',
+        'min' or 'max' uses a vectorized kernel; any other value is passed
+        to pandas `Resampler.agg`.  A dict maps column names to methods so
+        that each column can be aggregated differently in the same pass;
+        columns missing from the dict are summed.
+
+    Returns
+    -------
+    DataFrame
+        One row for every day from the first to the last timestamp, with
+        the same semantics as `resample('D').agg(how)`: empty days are 0
+        for 'sum' and 'count' and NaN otherwise.
+    """
+    if not isinstance(how, dict):
+        how = {col: how for col in row_data.columns}
+
+    index = pd.DatetimeIndex(row_data.index)
+    if len(index) == 0:
+        return pd.DataFrame(index=index[:0], columns=row_data.columns,
+                            dtype=float)
+
+    wall_clock = index.tz_localize(None)
+    ordinals = day_ordinals(index)
+    first, last = ordinals.min(), ordinals.max()
+    days = _day_index(first, last, index)
+    bins = ordinals - first
+    num_days = len(days)
+
+    # Data that is already one row per day at midnight needs no reduction,
+    # only padding out to the full range of days.
+    is_daily = index.is_unique and (wall_clock.normalize() == wall_clock).all()
+    if is_daily:
+        slots = bins
+        order = None
+    else:
+        # Sort once so min/max can reduce over contiguous runs of a day.
+        if np.all(bins[1:] >= bins[:-1]):
+            order = None
+            slots = bins
+        else:
+            order = np.argsort(bins, kind='stable')
+            slots = bins[order]
+
+    result = {}
+    for col in row_data.columns:
+        method = how.get(col, 'sum')
+        if method not in FAST_METHODS:
+            result[col] = (row_data[col].resample('D').agg(method)
+                                        .reindex(days))
+            continue
+        values = row_data[col].to_numpy(dtype=float)
+        if is_daily:
+            result[col] = _spread_days(values, slots, method, num_days)
+        else:
+            if order is not None:
+                values = values[order]
+            result[col] = _reduce_days(values, slots, method, num_days)
+
+    return pd.DataFrame(result, index=days, columns=row_data.columns)
+
+
+class DailyAccumulator(object):
+    """
+    Running per-day aggregates updated one chunk at a time.
+
+    Only the per-day state is kept (a sum, count, min or max array per
+    column, as the method needs), so memory is bounded by the number of
+    days rather than the number of rows seen.  Chunks may arrive in any
+    order and may overlap in time.
+
+    Parameters
+    ----------
+    how : string or dict
+        'sum', 'count', 'mean', 'min' or 'max', or a dict of column name to
+        one of those.  Columns missing from the dict are summed.  Arbitrary
+        callables cannot be folded chunk by chunk and are rejected.
+
+    Example
+    -------
+    >>> days = DailyAccumulator('mean')
+    >>> for chunk in pd.read_csv(path, index_col=0, parse_dates=True,
+    ...                          chunksize=1000000):
+    ...     days.add(chunk)
+    >>> by_day = days.result()
+    """
+    def __init__(self, how='sum'):
+        self.how = how
+        self.columns = None
+        self.first = None
+        self.last = None
+        self._index = None
+        self._state = {}
+
+    def add(self, chunk):
+        """
+        Fold a DataFrame chunk, indexed by a DatetimeIndex, into the
+        running aggregates.  Returns the accumulator.
+        """
+        if self.columns is None:
+            self._start(chunk)
+        index = pd.DatetimeIndex(chunk.index)
+        if len(index) == 0:
+            return self
+
+        ordinals = day_ordinals(index)
+        first, last = ordinals.min(), ordinals.max()
+        self._extend(first, last)
+        bins = ordinals - first
+        order = None
+        if np.any(bins[1:] < bins[:-1]):
+            order = np.argsort(bins, kind='stable')
+            bins = bins[order]
+        start = first - self.first
+        stop = last - self.first + 1
+
+        for col in self.columns:
+            values = chunk[col].to_numpy(dtype=float)
+            if order is not None:
+                values = values[order]
+            for stat in _STATS[self.how[col]]:
+                part = _reduce_days(values, bins, stat, stop - start)
+                total = self._state[col, stat][start:stop]
+                if stat == 'min':
+                    np.fmin(total, part, out=total)
+                elif stat == 'max':
+                    np.fmax(total, part, out=total)
+                else:
+                    total += part
+        return self
+
+    def result(self):
+        """
+        DataFrame of the aggregates for every day from the first to the
+        last timestamp seen, as `daily_aggregate` would return for all the
+        chunks concatenated.
+        """
+        if self.first is None:
+            index = pd.DatetimeIndex([]) if self._index is None else self._index
+            return pd.DataFrame(index=index, columns=self.columns, dtype=float)
+
+        result = {}
+        for col in self.columns:
+            method = self.how[col]
+            if method == 'mean':
+                total = self._state[col, 'sum']
+                count = self._state[col, 'count']
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result[col] = np.where(count > 0, total / count, np.nan)
+            else:
+                result[col] = self._state[col, method].copy()
+        days = _day_index(self.first, self.last, self._index)
+        return pd.DataFrame(result, index=days, columns=self.columns)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the per-day state."""
+        return sum(state.nbytes for state in self._state.values())
+
+    def _start(self, chunk):
+        """Fix the columns, methods and index type from the first chunk."""
+        self.columns = chunk.columns.tolist()
+        how = self.how
+        if not isinstance(how, dict):
+            how = {col: how for col in self.columns}
+        self.how = {col: how.get(col, 'sum') for col in self.columns}
+        for col, method in self.how.items():
+            if method not in FAST_METHODS:
+                raise ValueError('Cannot aggregate column {} by {!r} in chunks, '
+                                 'use one of {}'.format(col, method,
+                                                        ', '.join(FAST_METHODS)))
+        self._index = pd.DatetimeIndex(chunk.index)[:0]
+
+    def _extend(self, first, last):
+        """Grow the per-day state to cover the days first to last."""
+        if self.first is None:
+            self.first, self.last = first, first - 1
+        before = max(self.first - first, 0)
+        after = max(last - self.last, 0)
+        if before == 0 and after == 0:
+            return
+        for col in self.columns:
+            for stat in _STATS[self.how[col]]:
+                key = (col, stat)
+                if stat == 'count':
+                    pad = np.int64(0)
+                else:
+                    pad = 0.0 if stat == 'sum' else np.nan
+                self._state[key] = np.pad(
+                    self._state.get(key, np.empty(0, dtype=type(pad))),
+                    (before, after), constant_values=pad)
+        self.first = min(self.first, first)
+        self.last = max(self.last, last)
+
+
+# Running state needed for each method
+_STATS = {
+    'sum': ('sum',),
+    'count': ('count',),
+    'mean': ('sum', 'count'),
+    'min': ('min',),
+    'max': ('max',),
+}
+
+
+def day_ordinals(index):
+    """
+    Integer day number (days since 1970-01-01) of each timestamp, taken
+    from the local wall-clock time of timezone aware indexes.
+    """
+    return index.tz_localize(None).values.astype('datetime64[D]').astype(np.int64)
+
+
+def _day_index(first, last, like):
+    """
+    Daily DatetimeIndex from day ordinal first to last, with the resolution,
+    timezone and name of the index `like`.
+    """
+    days = np.arange(first, last + 1).astype('datetime64[D]')
+    return pd.DatetimeIndex(days.astype(like.tz_localize(None).dtype),
+                            freq='D', name=like.name).tz_localize(like.tz)
+
+
+def _spread_days(values, slots, method, num_days):
+    """Place at most one value per day into a full range of days."""
+    present = ~np.isnan(values)
+    if method == 'count':
+        out = np.zeros(num_days, dtype=np.int64)
+        out[slots] = present
+        return out
+    out = np.full(num_days, 0.0 if method == 'sum' else np.nan)
+    out[slots[present]] = values[present]
+    return out
+
+
+def _reduce_days(values, slots, method, num_days):
+    """
+    Reduce values into days.  `slots` holds the day of each value and
+    must be sorted for the 'min' and 'max' methods.
+    """
+    present = ~np.isnan(values)
+    if method == 'count':
+        return np.bincount(slots[present], minlength=num_days)
+    if method == 'sum':
+        return np.bincount(slots, weights=np.where(present, values, 0.0),
+                           minlength=num_days)
+    if method == 'mean':
+        total = np.bincount(slots, weights=np.where(present, values, 0.0),
+                            minlength=num_days)
+        count = np.bincount(slots[present], minlength=num_days)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(count > 0, total / count, np.nan)
+
+    # min and max: reduce each run of equal days, ignoring NaN
+    reduce = np.fmin if method == 'min' else np.fmax
+    starts = np.flatnonzero(np.r_[True, slots[1:] != slots[:-1]])
+    out = np.full(num_days, np.nan)
+    out[slots[starts]] = reduce.reduceat(values, starts)
+    return out
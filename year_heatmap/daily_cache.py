@@ -0,0 +1,264 @@
+"""
+In-process cache of daily aggregates and calendar grids for year_heatmap.
+
+A dashboard that plots the same growing frame many times a day spends
+most of each call aggregating years of history that have not changed.
+`DailyCache` keeps the daily aggregate of each frame it has seen, keyed by
+a fingerprint of the frame's first rows, the columns and `how`, together
+with the calendar grid of each year.  When the frame comes back with rows
+appended, only the grids of the years those rows fall in are rebuilt.
+If every method of `how` is one of the fast methods the rows are also
+folded into the running per-day state of a `DailyAccumulator`; a `how`
+with callables cannot be folded, so the whole frame is aggregated again
+on every append.
+
+Rows already seen are recognised by a SHA-256 digest of the whole cached
+part of the index and of every column, so a frame whose history was
+edited in place is aggregated again rather than served stale.  This
+check reads every row on every call, so its cost grows with the frame
+and not with the appended rows, but numbers and dates are hashed as
+their raw bytes at over a GB a second: about 0.1s for five million rows
+of three columns, well below the cost of aggregating them again.
+
+Entries are evicted, least recently used first, when the arrays they hold
+grow past `max_bytes`.
+"""
+
+from collections import OrderedDict, namedtuple
+import hashlib
+import threading
+
+from render_tools.lazy_import import lazy_import
+
+from .daily_aggregate import FAST_METHODS, DailyAccumulator, daily_aggregate
+from .year_heatmap import _calendar_grid
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+CacheInfo = namedtuple('CacheInfo', [
+    'hits',       # calls answered from the cache unchanged
+    'appends',    # calls that only aggregated appended rows
+    'misses',     # calls that aggregated the whole frame
+    'evictions',  # entries dropped to stay under max_bytes
+    'entries',    # entries held now
+    'nbytes',     # bytes held by the entries' arrays
+    'max_bytes',  # memory cap
+])
+
+# Rows at the start of a frame hashed for its cache key
+_KEY_ROWS = 8
+
+
+class DailyCache(object):
+    """
+    Cache of daily aggregates and calendar grids, passed to year_heatmap
+    as `cache=`.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Memory cap on the daily data, running per-day state and grids held
+        by all entries.  The least recently used entries are dropped when
+        it is exceeded.
+
+    Notes
+    -----
+    Every call hashes all the rows of the frame to check that the cached
+    ones are unchanged.  Appended rows are folded into the cached state
+    only when `how` names fast methods; with callables in `how` each
+    append aggregates the whole frame again and only the grids of the
+    unchanged years are saved.
+
+    Example
+    -------
+    >>> cache = DailyCache(max_bytes=64 * 2 ** 20)
+    >>> fig, ax = year_heatmap(events, how='count', cache=cache)
+    >>> events = pd.concat([events, todays_events])
+    >>> fig, ax = year_heatmap(events, how='count', cache=cache)
+    >>> cache.info()
+    CacheInfo(hits=0, appends=1, misses=1, evictions=0, entries=1, ...)
+    """
+    def __init__(self, max_bytes=256 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._hits = self._appends = self._misses = self._evictions = 0
+
+    def daily(self, row_data, how='sum'):
+        """
+        Daily aggregate of row_data, as `daily_aggregate(row_data, how)`
+        returns it, or row_data itself if how is None.  The returned frame
+        is shared with the cache and must not be modified.
+        """
+        key = _frame_key(row_data, how)
+        arrays = _row_arrays(row_data)
+        with self._lock:
+            entry = self._entries.get(key)
+            hashers = None if entry is None else entry.prefix_hashers(arrays)
+            if hashers is not None:
+                self._entries.move_to_end(key)
+                if len(row_data) == entry.rows:
+                    self._hits += 1
+                else:
+                    entry.append(row_data, arrays, hashers)
+                    self._appends += 1
+            else:
+                entry = _Entry(row_data, how, arrays)
+                self._misses += 1
+                self._entries[key] = entry
+            self._evict()
+            return entry.daily
+
+    def grid(self, by_day, years, firstweekday=0):
+        """
+        Calendar grid and layouts of `years`, as `_calendar_grid` returns
+        them, for daily data returned by `daily`.  Years already gridded
+        are reused and only the rest are scattered.  Other daily data is
+        gridded without caching.
+        """
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.daily is by_day:
+                    grid, layouts = entry.grid(years, firstweekday)
+                    self._evict()
+                    return grid, layouts
+        return _calendar_grid(by_day, years, firstweekday)
+
+    def info(self):
+        """Hit, append and miss counts, and the memory held."""
+        with self._lock:
+            return CacheInfo(self._hits, self._appends, self._misses,
+                             self._evictions, len(self._entries),
+                             self.nbytes, self.max_bytes)
+
+    @property
+    def nbytes(self):
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def clear(self):
+        """Drop every entry and reset the counts."""
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._appends = self._misses = self._evictions = 0
+
+    def _evict(self):
+        total = self.nbytes
+        while self._entries and total > self.max_bytes:
+            _, entry = self._entries.popitem(last=False)
+            total -= entry.nbytes
+            self._evictions += 1
+
+
+class _Entry(object):
+    """Daily data, running state and year grids of one source frame."""
+    def __init__(self, row_data, how, arrays):
+        self.how = how
+        self.rows = 0
+        self.grids = {}
+        self.accumulator = None
+        if how is None:
+            self.daily = row_data
+        elif _foldable(how):
+            self.accumulator = DailyAccumulator(how).add(row_data)
+            self.daily = self.accumulator.result()
+        else:
+            self.daily = daily_aggregate(row_data, how)
+        self._seen(arrays, [hashlib.sha256() for _ in arrays])
+
+    def _seen(self, arrays, hashers):
+        """Extend hashers of the rows seen so far by the rest of arrays."""
+        for hasher, values in zip(hashers, arrays):
+            hasher.update(memoryview(values[self.rows:]))
+        self.rows = len(arrays[0])
+        self.digests = [hasher.digest() for hasher in hashers]
+
+    def prefix_hashers(self, arrays):
+        """
+        Hashers of the first `rows` rows of arrays, from `_row_arrays`, if
+        those are the rows this entry was made from, otherwise None.
+        """
+        if len(arrays) != len(self.digests) or len(arrays[0]) < self.rows:
+            return None
+        hashers = [hashlib.sha256(memoryview(values[:self.rows]))
+                   for values in arrays]
+        if [hasher.digest() for hasher in hashers] != self.digests:
+            return None
+        return hashers
+
+    def append(self, row_data, arrays, hashers):
+        """
+        Bring the entry up to date with the rows after the cached ones.
+        A `how` that cannot be folded is aggregated over every row again.
+        """
+        new_rows = row_data.iloc[self.rows:]
+        if self.how is None:
+            self.daily = row_data
+        elif self.accumulator is not None:
+            self.daily = self.accumulator.add(new_rows).result()
+        else:
+            self.daily = daily_aggregate(row_data, self.how)
+        # Only the calendars of the years the new rows fall in change
+        changed = set(pd.DatetimeIndex(new_rows.index).year)
+        self.grids = {key: block for key, block in self.grids.items()
+                      if key[0] not in changed}
+        self._seen(arrays, hashers)
+
+    def grid(self, years, firstweekday):
+        missing = [year for year in years
+                   if (year, firstweekday) not in self.grids]
+        if missing:
+            grid, layouts = _calendar_grid(self.daily, missing, firstweekday)
+            for yr_idx, year in enumerate(missing):
+                self.grids[year, firstweekday] = (grid[:, yr_idx],
+                                                  layouts[yr_idx])
+        blocks = [self.grids[year, firstweekday] for year in years]
+        if not blocks:
+            return np.empty((self.daily.shape[1], 0, 7, 54)), []
+        return (np.stack([block for block, _ in blocks], axis=1),
+                [layout for _, layout in blocks])
+
+    @property
+    def nbytes(self):
+        nbytes = int(self.daily.memory_usage(index=True).sum())
+        if self.accumulator is not None:
+            nbytes += self.accumulator.nbytes
+        return nbytes + sum(block.nbytes for block, _ in self.grids.values())
+
+
+def _foldable(how):
+    """True if every method of how can be folded a chunk at a time."""
+    methods = how.values() if isinstance(how, dict) else [how]
+    return all(isinstance(m, str) and m in FAST_METHODS for m in methods)
+
+
+def _how_key(how):
+    if isinstance(how, dict):
+        return tuple((col, how[col]) for col in sorted(how, key=str))
+    return how
+
+
+def _frame_key(row_data, how):
+    """Cache key from the columns, how and a hash of the first rows."""
+    head = pd.util.hash_pandas_object(row_data.iloc[:_KEY_ROWS])
+    return (tuple(row_data.columns), _how_key(how),
+            head.to_numpy().tobytes())
+
+
+def _row_arrays(row_data):
+    """
+    The index and each column of row_data as a contiguous array whose bytes
+    change with any value: numbers and dates as they are, anything else as
+    pandas' hash of each value.
+    """
+    arrays = []
+    for column in [row_data.index] + [row_data.iloc[:, i]
+                                      for i in range(row_data.shape[1])]:
+        if column.dtype.kind in 'mM':
+            values = column.array.asi8
+        else:
+            values = column.to_numpy()
+            if values.dtype.kind not in 'biufc':
+                values = pd.util.hash_array(values)
+        arrays.append(np.ascontiguousarray(values))
+    return arrays
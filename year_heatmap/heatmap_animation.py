@@ -0,0 +1,91 @@
+"""
+Animated calendar heatmaps that fill in day by day.
+
+The calendars are drawn once by year_heatmap and each frame only masks the
+days after the current date on the existing meshes.  Frames are streamed
+to disk as they are drawn, so memory does not grow with the number of
+frames.
+"""
+
+import datetime
+
+from render_tools.lazy_import import lazy_import
+
+from .calendar_layout import year_layout
+from .daily_aggregate import daily_aggregate, day_ordinals
+from .year_heatmap import year_heatmap
+
+animation = lazy_import('matplotlib.animation')
+np = lazy_import('numpy')
+
+
+def animate_year_heatmap(df, value_cols=None, time_col=None, year=None,
+                         how='sum', step=1, interval=50, **kwargs):
+    """
+    Animate calendar heatmaps filling in from the first day to the last.
+
+    Parameters
+    ----------
+    df, value_cols, time_col, year, how
+        As for `year_heatmap`.
+    step : int
+        Number of days added in each frame.
+    interval : int
+        Delay between frames in milliseconds when shown on screen.
+    kwargs : other keyword arguments
+        All other keyword arguments are passed to `year_heatmap`, which is
+        drawn with the 'subplots' layout.  The colour scale is fixed from
+        the whole series.
+    Returns
+    -------
+    anim : matplotlib FuncAnimation
+        A blitted animation.  Use `render_tools.animation.save_animation` to
+        write it to a GIF or a sequence of PNG files.
+    """
+    if value_cols is None:
+        value_cols = [c for c in df.columns if c != time_col]
+    elif type(value_cols) == str:
+        value_cols = [value_cols]
+    by_day = df if time_col is None else df.set_index(time_col)
+    by_day = by_day[value_cols]
+    if how is not None:
+        by_day = daily_aggregate(by_day, how)
+
+    years = sorted(set(by_day.index.year))
+    if year is not None:
+        years = [y for y in years if y == year]
+    fig, axes = year_heatmap(by_day, value_cols=value_cols, year=year,
+                             how=None, layout='subplots', **kwargs)
+    firstweekday = kwargs.get('firstweekday', 0)
+
+    # The data mesh of every calendar, with the day ordinal of each cell
+    meshes, values, cell_days = [], [], []
+    nrows = len(value_cols)
+    for yr_idx, yr in enumerate(years):
+        cal_layout = year_layout(yr, firstweekday)
+        jan1 = (datetime.date(yr, 1, 1) - datetime.date(1970, 1, 1)).days
+        days = np.where(cal_layout.cell_day >= 0,
+                        jan1 + cal_layout.cell_day.astype(np.int64),
+                        np.iinfo(np.int64).max)[:, :cal_layout.width]
+        for ax in axes[yr_idx * nrows:(yr_idx + 1) * nrows, 0]:
+            mesh = ax.collections[-1]
+            meshes.append(mesh)
+            values.append(np.ma.asarray(mesh.get_array()).copy())
+            cell_days.append(days)
+
+    def update(day):
+        for mesh, data, days in zip(meshes, values, cell_days):
+            mesh.set_array(np.ma.masked_where(days > day, data))
+        return meshes
+
+    start, stop = day_ordinals(by_day.index[[0, -1]])
+    if years:
+        start = max(start, (datetime.date(years[0], 1, 1)
+                            - datetime.date(1970, 1, 1)).days)
+        stop = min(stop, (datetime.date(years[-1], 12, 31)
+                          - datetime.date(1970, 1, 1)).days)
+    frames = list(range(start, stop, step)) + [stop]
+    return animation.FuncAnimation(fig, update, frames=frames,
+                                   init_func=lambda: update(start - 1),
+                                   interval=interval, blit=True)
+
@@ -7,12 +7,22 @@ Based on Martijn Vermaat's calmap:  https://github.com/martijnvermaat/calmap
 """
 
 import calendar
-import datetime
+from contextlib import nullcontext
 
-from matplotlib.colors import ColorConverter, ListedColormap
-import matplotlib.pyplot as plt
-import numpy as np
-import pandas as pd
+from render_tools.lazy_import import lazy_import
+from render_tools.scale_stats import ScaleStats
+
+from .calendar_layout import year_layout
+from .daily_aggregate import DailyAccumulator, daily_aggregate
+
+mpl = lazy_import('matplotlib')
+backend_agg = lazy_import('matplotlib.backends.backend_agg')
+mcolors = lazy_import('matplotlib.colors')
+mfigure = lazy_import('matplotlib.figure')
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+_NO_PHASE = nullcontext()
 
 
 def year_heatmap(df,value_cols=None, time_col=None, year=None, 
@@ -21,14 +31,19 @@ def year_heatmap(df,value_cols=None, time_col=None, year=None,
                    daylabels=calendar.day_abbr[:], dayticks=True,
                    monthlabels=calendar.month_abbr[1:], 
                    monthticks=True, base_figsize=(15,5),
-                   fsize=None,vgap=None, **kwargs):
+                   fsize=None,vgap=None, layout='subplots', firstweekday=0,
+                   fig=None, profile=None, clip=None, cache=None,
+                   **kwargs):
     """
     Plot multiple values and years from a timeseries as a calendar heatmap. 
     
     Parameters
     ----------
-    df : DataFrame
-        Data for the plot. Must be indexed by a DatetimeIndex.
+    df : DataFrame or DailyStore
+        Data for the plot. Must be indexed by a DatetimeIndex.  The days of
+        the plotted years are read from a render_tools DailyStore, or any
+        object with the same `frame` method, as views of its file, and are
+        not aggregated again.
     value_cols: list or str
         Single colum name or list of column names containing the values
         to be heatmapped. Default is all Columns.
@@ -37,13 +52,16 @@ def year_heatmap(df,value_cols=None, time_col=None, year=None,
     year : integer
         Only data indexed by this year will be plotted. If `None`, the first
         year for which there is data will be plotted.
-    how : string
-        Method for resampling data by day. If `None`, assume data is already
-        sampled by day and don't resample. Otherwise, this is passed to Pandas
-        `Series.resample`.
+    how : string, callable or dict
+        Method for aggregating data by day. If `None`, assume data is already
+        sampled by day and don't resample. 'sum', 'count', 'mean', 'min' and
+        'max' are computed with a vectorized kernel, anything else is passed
+        to Pandas `Resampler.agg`. A dict of column name to method aggregates
+        each column differently.
     vmin, vmax : floats
-        Values to anchor the colormap. If `None`, min and max are used after
-        resampling data by day.
+        Values to anchor the colormap of every column. If `None`, the min
+        and max (or the `clip` percentiles) of each column's plotted days
+        are used, so every column gets its own colour scale.
     colour_map : List of matplotlib colormap name or object
         The mapping from data values to color space for each column in value_cols
     fillcolor : matplotlib color
@@ -54,7 +72,8 @@ def year_heatmap(df,value_cols=None, time_col=None, year=None,
         Color of the lines that will divide each day. If `None`, the axes
         background color is used, or 'white' if it is transparent.
     daylabels : list
-        Strings to use as labels for days, must be of length 7.
+        Strings to use as labels for days, must be of length 7, starting
+        with Monday.
     dayticks : list or int or bool
         If `True`, label all days. If `False`, don't label days. If a list,
         only label days with these indices. If an integer, label every n day.
@@ -76,14 +95,56 @@ def year_heatmap(df,value_cols=None, time_col=None, year=None,
         
         To adjust plot spacing by hand, values of fsize, vgap and base_figsize
         must be tweaked together.
+    layout : string
+        'subplots' draws every column of every year on its own axes.
+        'single' packs all years and columns into a single axes with one
+        mesh per colormap, separated by gap rows, so that drawing time
+        stays roughly constant as the number of years grows.  Days without
+        data show the axes background, which is set to `fillcolor`.  In
+        this layout base_figsize[0] is the figure width, the height follows
+        from the number of calendars and vgap is the number of empty cell
+        rows between years.
+    firstweekday : int
+        Weekday shown at the top of each calendar, 0 is Monday and 6 is
+        Sunday.
+    fig : matplotlib Figure
+        Figure to draw on.  It is resized to fit the calendars.  If `None`,
+        a new Figure with an Agg canvas is made, without using pyplot.
+    profile : callable
+        Called with the name of each phase of the plot, 'aggregate',
+        'grid', 'scale', 'figure', 'artists' and then 'layout' (or 'labels' for the
+        'single' layout), and used as a context manager around it, such
+        as render_tools' PhaseProfile.  If `None`, nothing is recorded.
+    clip : (float, float)
+        Percentiles, such as (2, 98), used for the colour limits of each
+        column instead of its min and max, so that a few extreme days do
+        not wash out the rest.  They are approximated in one pass with a
+        bounded quantile sketch.
+    cache : DailyCache
+        Cache of daily aggregates and calendar grids to use and fill.  When
+        df is a frame seen before with rows appended, only the new rows are
+        aggregated and only the calendars of their years are rebuilt.  If
+        `None`, everything is computed afresh.
     kwargs : other keyword arguments
         All other keyword arguments are passed to matplotlib `ax.pcolormesh`.
     Returns
     -------
     fig, ax : matplotlib Figure and Axes
-        Fig and Axes objects with the calendar heatmap.
+        Fig and Axes objects with the calendar heatmap.  For the 'single'
+        layout ax is one Axes object rather than an array.
     
     """    
+    phase = profile or _no_phase
+
+    # A daily store, told apart from a frame by its frame() method
+    if callable(getattr(type(df), 'frame', None)):
+        if year is None:
+            df = df.frame(value_cols)
+        else:
+            df = df.frame(value_cols, '{}-01-01'.format(year),
+                          '{}-12-31'.format(year))
+        time_col, how = None, None
+
     if value_cols == None:
         value_cols = df.columns.tolist()
     elif type(value_cols) == str:
@@ -98,12 +159,13 @@ def year_heatmap(df,value_cols=None, time_col=None, year=None,
     if colour_map is None:
         colour_map = ['Purples', 'Reds', 'Blues', 'Greys']
 
-    if how is None:
-        # Assume already sampled by day.
-        row_data = data
-    else:
+    if cache is not None:
+        with phase('aggregate'):
+            row_data = cache.daily(row_data, how)
+    elif how is not None:
         # Sample by day.
-        row_data = row_data.resample('D').agg(how)
+        with phase('aggregate'):
+            row_data = daily_aggregate(row_data, how)
     
     # Number of rows of plot to print for each year
     nrows = len(value_cols)
@@ -115,6 +177,37 @@ def year_heatmap(df,value_cols=None, time_col=None, year=None,
     if year is not None:
         years = [y for y in years if y==year]
     num_years = len(years)
+
+    # Scatter every column for every year into calendar cells in one pass.
+    with phase('grid'):
+        if cache is not None:
+            grid, layouts = cache.grid(row_data, years, firstweekday)
+        else:
+            grid, layouts = _calendar_grid(row_data[value_cols], years,
+                                           firstweekday)
+
+    # Colour limits of each column from one pass over its plotted days
+    with phase('scale'):
+        stats = ScaleStats(sketch_size=None if clip is None else 1024)
+        stats.add(grid.reshape(nrows, -1).T)
+        limits = []
+        for idx in range(nrows):
+            low, high = stats.limits(idx, clip)
+            limits.append((low if vmin is None else vmin,
+                           high if vmax is None else vmax))
+
+    dayticks = _tick_indices(dayticks, daylabels)
+    monthticks = _tick_indices(monthticks, monthlabels)
+
+    if layout == 'single':
+        return _single_mesh_heatmap(grid, layouts, years, value_cols,
+                                    colour_map, limits, fillcolor,
+                                    linewidth, linecolor, daylabels, dayticks,
+                                    monthlabels, monthticks, base_figsize,
+                                    fsize, vgap, fig, phase, **kwargs)
+    elif layout != 'subplots':
+        raise ValueError("layout must be 'subplots' or 'single', "
+                         "not {!r}".format(layout))
     
     # Calculate appropriate sizes for fonts and gaps
     if num_years == 1 or nrows>=3:
@@ -142,22 +235,42 @@ def year_heatmap(df,value_cols=None, time_col=None, year=None,
     figsize = (base_figsize[0]*len(years), 
                base_figsize[1]*len(years)+v_gap*(len(years)-1))
     
-    fig, axes = plt.subplots(figsize=figsize, nrows=nrows*len(years), ncols=1, squeeze=False)
-    
+    with phase('figure'):
+        fig = _prepare_figure(fig, figsize)
+        axes = fig.subplots(nrows=nrows*len(years), ncols=1, squeeze=False)
+
+    with phase('artists'):
+        _draw_subplots(axes, grid, layouts, years, value_cols, colour_map,
+                       limits, fillcolor, linewidth, linecolor, daylabels,
+                       dayticks, monthlabels, monthticks, fontsize, kwargs)
+
+    # tidy up
+    with phase('layout'):
+        fig.tight_layout()
+    return fig, axes
+
+
+def _draw_subplots(axes, grid, layouts, years, value_cols, colour_map, limits,
+                   fillcolor, linewidth, linecolor, daylabels, dayticks,
+                   monthlabels, monthticks, fontsize, kwargs):
+    """Draw each column of each year's calendar on its own axes."""
+    nrows = len(value_cols)
     for yr_idx, year in enumerate(years):
         axes_y = axes[yr_idx*nrows:(yr_idx*nrows+(nrows))]
+        cal_layout = layouts[yr_idx]
+        width = cal_layout.width
+
+        # Cells for all days of the year, not just those we have data for.
+        fill_data = np.ma.masked_where(~cal_layout.in_year[:, :width],
+                                       np.ones((7, width)))
+
         for idx, ax_lst in enumerate(axes_y):
             
-            data = row_data[value_cols[idx]]
             ax = ax_lst[0]
             cmap = colour_map[idx]
             
-            by_day = data
-            # Min and max per day.
-            if vmin is None:
-                vmin = by_day.min()
-            if vmax is None:
-                vmax = by_day.max()
+            # Colour limits of this column
+            vmin, vmax = limits[idx]
 
             if linecolor is None:
                 # Unfortunately, linecolor cannot be transparent, as it is drawn on
@@ -167,39 +280,14 @@ def year_heatmap(df,value_cols=None, time_col=None, year=None,
                 # background so in that case we default to white which will usually be
                 # the figure or canvas background color.
                 linecolor = ax.get_fc()
-                if ColorConverter().to_rgba(linecolor)[-1] == 0:
+                if mcolors.ColorConverter().to_rgba(linecolor)[-1] == 0:
                     linecolor = 'white'
 
-            # Filter on year.
-            by_day = by_day[str(year)]
-
-            # Add missing days.
-            by_day = by_day.reindex(
-                pd.date_range(start=str(year), end=str(year + 1), freq='D')[:-1])
-
-            # Create data frame we can pivot later.
-            by_day = pd.DataFrame({'data': by_day,
-                                   'fill': 1,
-                                   'day': by_day.index.dayofweek,
-                                   'week': by_day.index.week})
-
-            # There may be some days assigned to previous year's last week or
-            # next year's first week. We create new week numbers for them so
-            # the ordering stays intact and week/day pairs unique.
-            by_day.loc[(by_day.index.month == 1) & (by_day.week > 50), 'week'] = 0
-            by_day.loc[(by_day.index.month == 12) & (by_day.week < 10), 'week'] \
-                = by_day.week.max() + 1
-
-            # Pivot data on day and week and mask NaN days.
-            plot_data = by_day.pivot('day', 'week', 'data').values[::-1]
-            plot_data = np.ma.masked_where(np.isnan(plot_data), plot_data)
-
-            # Do the same for all days of the year, not just those we have data for.
-            fill_data = by_day.pivot('day', 'week', 'fill').values[::-1]
-            fill_data = np.ma.masked_where(np.isnan(fill_data), fill_data)
+            # Mask NaN days.
+            plot_data = np.ma.masked_invalid(grid[idx, yr_idx, :, :width])
 
             # Draw heatmap for all days of the year with fill color.
-            ax.pcolormesh(fill_data, vmin=0, vmax=1, cmap=ListedColormap([fillcolor]))
+            ax.pcolormesh(fill_data, vmin=0, vmax=1, cmap=mcolors.ListedColormap([fillcolor]))
 
             # Draw heatmap.
             kwargs['linewidth'] = linewidth
@@ -218,40 +306,272 @@ def year_heatmap(df,value_cols=None, time_col=None, year=None,
             ax.xaxis.set_tick_params(which='both', length=0)
             ax.yaxis.set_tick_params(which='both', length=0)
 
-            # Get indices for daylabels.
-            if dayticks is True:
-                dayticks = range(len(daylabels))
-            elif dayticks is False:
-                dayticks = []
-            elif isinstance(dayticks, int):
-                dayticks = range(len(daylabels))[dayticks // 2::dayticks]
-
             ax.set_xlabel('',fontsize=2)
-            ax.set_xticklabels(['']*len(monthlabels), ha='center', fontsize=2)
+            ax.set_xticks([])
 
             ax.set_ylabel('')
             ax.yaxis.set_ticks_position('right')
-            ax.set_yticks([6 - i + 0.5 for i in dayticks])
+            ax.set_yticks([cal_layout.weekday_rows[i] + 0.5 for i in dayticks])
             ax.set_yticklabels([daylabels[i] for i in dayticks], rotation='horizontal',
                                va='center', fontsize=fontsize)
 
             ax.set_title(value_cols[idx], loc='left', fontsize=fontsize)
 
-        # Get indices for monthlabels.
-        if monthticks is True:
-            monthticks = range(len(monthlabels))
-        elif monthticks is False:
-            monthticks = []
-        elif isinstance(monthticks, int):
-            monthticks = range(len(monthlabels))[monthticks // 2::monthticks]
-
-        ax.set_xticks([by_day.loc[datetime.date(year, i + 1, 15)].week
-                           for i in monthticks])
+        ax.set_xticks(cal_layout.month_ticks[list(monthticks)])
 
         ax.set_xticklabels([monthlabels[i] for i in monthticks], 
                             ha='center', fontsize=fontsize)
         ax.set_xlabel(str(year), ha='center', fontsize=fontsize)
 
-    # tidy up
-    fig.tight_layout()
-    return fig, axes
\ No newline at end of file
+
+
+def year_heatmap_chunks(chunks, value_cols=None, time_col=None, how='sum',
+                        **kwargs):
+    """
+    Plot a calendar heatmap from data that arrives in chunks.
+
+    Each chunk is folded into running per-day aggregates and then
+    discarded, so peak memory depends on the number of days rather than
+    the number of rows.  The daily data is then plotted exactly as
+    `year_heatmap` would plot the whole frame.
+
+    Parameters
+    ----------
+    chunks : iterable of DataFrame
+        For example ``pd.read_csv(path, parse_dates=['time'], chunksize=n)``
+        or a generator of ``to_pandas()`` frames from Parquet row groups.
+    value_cols: list or str
+        Single colum name or list of column names containing the values
+        to be heatmapped. Default is all Columns of the first chunk other
+        than time_col.
+    time_col: str
+        Name of column where time series data is.  Default is the index
+    how : string or dict
+        Method for aggregating data by day: 'sum', 'count', 'mean', 'min'
+        or 'max', or a dict of column name to method.
+    kwargs : other keyword arguments
+        All other keyword arguments are passed to `year_heatmap`.
+    Returns
+    -------
+    fig, ax : matplotlib Figure and Axes
+        Fig and Axes objects with the calendar heatmap.
+    """
+    if type(value_cols) == str:
+        value_cols = [value_cols]
+
+    days = DailyAccumulator(how)
+    with (kwargs.get('profile') or _no_phase)('aggregate'):
+        for chunk in chunks:
+            if value_cols is None:
+                value_cols = [c for c in chunk.columns if c != time_col]
+            if time_col is not None:
+                chunk = chunk.set_index(time_col)
+            days.add(chunk[value_cols])
+
+    return year_heatmap(days.result(), value_cols=value_cols, how=None,
+                        **kwargs)
+
+
+def _calendar_grid(by_day, years, firstweekday=0):
+    """
+    Scatter daily values into calendar cells for every column and year.
+
+    Cell coordinates come from the cached `year_layout` tables: each day
+    is placed at the row of its weekday and at the column of the week
+    containing it, counting the week holding 1 January as column 0.
+
+    Parameters
+    ----------
+    by_day : DataFrame
+        Values sampled by day, indexed by a DatetimeIndex.
+    years : list of int
+        Sorted years to lay out.
+    firstweekday : int
+        Weekday at the top of each calendar, 0 is Monday.
+
+    Returns
+    -------
+    grid : ndarray
+        Float array of shape (columns, years, 7, 54).  Cells with no data,
+        or which fall outside the year, are NaN.
+    layouts : list of YearLayout
+        Layout of each year.
+    """
+    layouts = [year_layout(year, firstweekday) for year in years]
+    rows = np.zeros((len(years), 366), dtype=np.int8)
+    cols = np.zeros((len(years), 366), dtype=np.int8)
+    for yr_idx, layout in enumerate(layouts):
+        rows[yr_idx, :len(layout.rows)] = layout.rows
+        cols[yr_idx, :len(layout.cols)] = layout.cols
+
+    # Calendar cell coordinates for the days we do have data for.
+    index = pd.DatetimeIndex(by_day.index)
+    keep = np.isin(index.year, years)
+    index = index[keep]
+    yr_idx = np.searchsorted(years, index.year)
+    day = index.dayofyear.to_numpy() - 1
+
+    grid = np.full((by_day.shape[1], len(years), 7, 54), np.nan)
+    grid[:, yr_idx, rows[yr_idx, day], cols[yr_idx, day]] = \
+        by_day.to_numpy(dtype=float)[keep].T
+
+    return grid, layouts
+
+
+def _single_mesh_heatmap(grid, layouts, years, value_cols, colour_map, limits,
+                         fillcolor, linewidth, linecolor, daylabels,
+                         dayticks, monthlabels, monthticks, base_figsize,
+                         fsize, vgap, fig=None, phase=None, **kwargs):
+    """
+    Draw every calendar onto one axes, with one mesh per colormap.
+
+    Calendars are stacked top to bottom in the same order as the subplots
+    layout (each column in turn for each year).  Each column is scaled to
+    0..1 between its own colour limits, so columns sharing a mesh keep
+    their own scales.  Rows between calendars are given a value below 0
+    so the colormap's under colour paints them with the figure background
+    (pcolormesh masks infinite values), and days without data are left
+    transparent so the axes background, set to `fillcolor`, shows
+    through.  Labels are placed from the computed
+    row offsets rather than by `tight_layout`.
+    """
+    phase = phase or _no_phase
+    num_cols = len(value_cols)
+    title_rows = 1.5
+    label_rows = 3
+    year_gap = 1 if vgap is None else vgap
+
+    # Row (counted down from the top) at which each calendar starts
+    tops = []
+    row = 0
+    for _ in years:
+        for _ in value_cols:
+            row += title_rows
+            tops.append(row)
+            row += 7
+        row += label_rows + year_gap
+    height = int(np.ceil(row - year_gap))
+    # Whole mesh row at which each calendar's bottom edge sits, shared by
+    # the cells and their labels so they line up
+    bottoms = [int(height - top - 7) for top in tops]
+
+    # Size the figure so that cells are square, with margins for labels
+    margin_left, margin_right, margin_v = 1, 5, 1
+    width_in = base_figsize[0]
+    cell_in = width_in / (54 + margin_left + margin_right)
+    height_in = cell_in * (height + 2 * margin_v)
+    with phase('figure'):
+        fig = _prepare_figure(fig, (width_in, height_in))
+        ax = fig.add_axes([margin_left * cell_in / width_in,
+                           margin_v * cell_in / height_in,
+                           54 * cell_in / width_in,
+                           height * cell_in / height_in])
+    fontsize = 0.6 * cell_in * 72 if fsize is None else fsize
+
+    background = fig.get_facecolor()
+    if mcolors.ColorConverter().to_rgba(background)[-1] == 0:
+        background = 'white'
+    if linecolor is None:
+        linecolor = background
+    ax.set_facecolor(fillcolor)
+
+    with phase('artists'):
+        # Cells belonging to each calendar, in mesh row order (y upwards)
+        owner = np.full((height, 54), -1)
+        cells = np.full((height, 54), np.nan)
+        block = 0
+        for yr_idx in range(len(years)):
+            for idx in range(num_cols):
+                bottom = bottoms[block]
+                owner[bottom:bottom + 7] = np.where(layouts[yr_idx].in_year, idx, -1)
+                low, high = limits[idx]
+                span = high - low if high > low else np.inf
+                cells[bottom:bottom + 7] = np.clip((grid[idx, yr_idx] - low) / span,
+                                                   0, 1)
+                block += 1
+
+        line_rgba = mcolors.ColorConverter().to_rgba(linecolor)
+        kwargs['linewidth'] = linewidth
+        # One mesh per colormap, with the calendars drawn in it.  Colormap
+        # objects are not hashable, so they are told apart by identity
+        meshes = {}
+        for idx, cmap in enumerate(colour_map):
+            key = cmap if isinstance(cmap, str) else id(cmap)
+            meshes.setdefault(key, []).append(idx)
+        for mesh_idx, members in enumerate(meshes.values()):
+            own = np.isin(owner, members)
+            data = np.where(own, cells, np.nan)
+            cmap = mpl.colormaps.get_cmap(colour_map[members[0]]).copy()
+            if mesh_idx == 0:
+                # The first mesh also paints everything outside the calendars
+                data[owner < 0] = -1
+                cmap.set_under(background)
+            edges = np.zeros(own.shape + (4,))
+            edges[own] = line_rgba
+            kwargs['edgecolors'] = edges.reshape(-1, 4)
+            ax.pcolormesh(np.ma.masked_where(np.isnan(data), data),
+                          vmin=0, vmax=1, cmap=cmap, **kwargs)
+
+    with phase('labels'):
+        ax.set(xlim=(0, 54), ylim=(0, height))
+        for side in ('top', 'right', 'left', 'bottom'):
+            ax.spines[side].set_visible(False)
+        ax.xaxis.set_tick_params(which='both', length=0)
+        ax.yaxis.set_tick_params(which='both', length=0)
+        ax.set_xticks([])
+
+        # Day labels for every calendar, titles above and months below each year
+        ax.yaxis.set_ticks_position('right')
+        yticks, ylabels = [], []
+        block = 0
+        for yr_idx, year in enumerate(years):
+            for idx in range(num_cols):
+                bottom = bottoms[block]
+                yticks += [bottom + layouts[yr_idx].weekday_rows[i] + 0.5
+                           for i in dayticks]
+                ylabels += [daylabels[i] for i in dayticks]
+                ax.text(0, bottom + 7.2, value_cols[idx], ha='left', va='bottom',
+                        fontsize=fontsize)
+                block += 1
+            months = layouts[yr_idx].month_ticks
+            for i in monthticks:
+                ax.text(months[i], bottom - 0.3, monthlabels[i], ha='center',
+                        va='top', fontsize=fontsize)
+            ax.text(layouts[yr_idx].width / 2, bottom - 1.7, str(year),
+                    ha='center', va='top', fontsize=fontsize)
+        ax.set_yticks(yticks)
+        ax.set_yticklabels(ylabels, va='center', fontsize=fontsize)
+
+    return fig, ax
+
+
+def _no_phase(name):
+    """Profile used when none is given, which records nothing."""
+    return _NO_PHASE
+
+
+def _prepare_figure(fig, figsize):
+    """
+    A new Figure of figsize drawn by an Agg canvas, which does not touch
+    pyplot's global state, or the given figure resized to figsize.
+    """
+    if fig is None:
+        fig = mfigure.Figure(figsize=figsize)
+        backend_agg.FigureCanvasAgg(fig)
+    else:
+        fig.set_size_inches(figsize)
+    return fig
+
+
+def _tick_indices(ticks, labels):
+    """
+    Indices of the labels to show: all of them if `ticks` is True, none if
+    False, every n-th if an integer, otherwise the given list.
+    """
+    if ticks is True:
+        return range(len(labels))
+    elif ticks is False:
+        return []
+    elif isinstance(ticks, int):
+        return range(len(labels))[ticks // 2::ticks]
+    return ticks